@@ -0,0 +1,42 @@
+import json
+import os
+import platform
+
+CONFIG_FILE_NAME = 'config.json'
+
+
+def get_app_data_dir():
+    """获取工具的数据目录(配置、缓存等)，可用环境变量 JX3_MIGRATOR_HOME 指定"""
+    custom_dir = os.environ.get('JX3_MIGRATOR_HOME')
+    if custom_dir:
+        data_dir = custom_dir
+    elif platform.system() == 'Windows':
+        base_dir = os.environ.get('APPDATA') or os.path.expanduser('~')
+        data_dir = os.path.join(base_dir, 'JX3_RoleMigratorTool')
+    else:
+        base_dir = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+        data_dir = os.path.join(base_dir, 'jx3_role_migrator')
+
+    try:
+        os.makedirs(data_dir, exist_ok=True)
+    except OSError:
+        pass
+    return data_dir
+
+
+def get_config_path():
+    return os.path.join(get_app_data_dir(), CONFIG_FILE_NAME)
+
+
+def load_config():
+    """读取用户配置，文件不存在或格式错误时返回空配置"""
+    config_path = get_config_path()
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"读取配置文件 {config_path} 失败: {str(e)}")
+        return {}
+    return config if isinstance(config, dict) else {}
@@ -0,0 +1,92 @@
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import tkinter as tk
+
+from app_config import get_app_data_dir
+
+LOG_DIR_NAME = 'logs'
+LOG_FILE_NAME = 'migrator.log'
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 日志框中最多保留的行数
+LOG_VIEW_MAX_LINES = 500
+# 日志框批量刷新的间隔(毫秒)
+LOG_FLUSH_INTERVAL_MS = 100
+
+
+def get_log_dir():
+    return os.path.join(get_app_data_dir(), LOG_DIR_NAME)
+
+
+def get_log_path():
+    return os.path.join(get_log_dir(), LOG_FILE_NAME)
+
+
+class LogView:
+    """操作日志：完整日志由后台线程写入按大小轮转的日志文件，日志框只显示最近的若干行
+
+    append 可以频繁调用，日志框每隔 LOG_FLUSH_INTERVAL_MS 毫秒批量插入一次，
+    超出 max_lines 的旧行从日志框中删除。
+    """
+
+    def __init__(self, text_widget, max_lines=LOG_VIEW_MAX_LINES):
+        self.text = text_widget
+        self.max_lines = max_lines
+        self._pending = collections.deque(maxlen=max_lines)
+        self._lines = 0  # 日志框中的行数
+        self._flush_id = None
+        self._logger, self._listener = self._create_file_logger()
+
+    def _create_file_logger(self):
+        """日志文件写入放在 QueueListener 的后台线程中，界面线程只把记录放入队列"""
+        logger = logging.getLogger('jx3_role_migrator')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            os.makedirs(get_log_dir(), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                get_log_path(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        except OSError as e:
+            print(f"无法创建日志文件: {str(e)}")
+            return logger, None
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+
+        log_queue = queue.Queue()
+        logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        return logger, listener
+
+    def append(self, entry, level=logging.INFO):
+        """记录一条日志，entry 为日志框中显示的文本(不含换行)"""
+        self._logger.log(level, entry)
+        self._pending.append(entry)
+        if self._flush_id is None:
+            self._flush_id = self.text.after(LOG_FLUSH_INTERVAL_MS, self.flush)
+
+    def flush(self):
+        self._flush_id = None
+        if not self._pending:
+            return
+        entries = list(self._pending)
+        self._pending.clear()
+
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, "".join(entry + "\n" for entry in entries))
+        self._lines += sum(entry.count("\n") + 1 for entry in entries)
+        if self._lines > self.max_lines:
+            # 删除最早的行，只保留最近 max_lines 行
+            self.text.delete("1.0", f"{self._lines - self.max_lines + 1}.0")
+            self._lines = self.max_lines
+        self.text.see(tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def close(self):
+        """停止后台写入线程，写完队列中剩余的日志"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
@@ -0,0 +1,234 @@
+import json
+import lzma
+import os
+import shutil
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from copy_executor import get_copy_workers
+from sync_engine import scan_tree
+
+ARCHIVE_SUFFIX = '.zip'
+
+# 压缩方式
+CODEC_DEFLATE = 'deflate'
+CODEC_LZMA = 'lzma'
+
+# 归档内记录精确修改时间的索引(zip 自带的时间只精确到 2 秒)
+INDEX_NAME = '.jx3_backup_index.json'
+
+# 每批并行压缩的文件数为线程数的倍数，限制内存中等待写入的压缩数据
+BATCH_PER_WORKER = 8
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_MAX_ENTRIES = 0xFFFF
+_FLAG_UTF8 = 0x800
+_FLAG_LZMA_EOS = 0x02
+_READ_CHUNK_SIZE = 1024 * 1024
+# 解压所需的 zip 版本
+_DEFLATED_VERSION = 20
+_LZMA_VERSION = 63
+# zip 中的 LZMA 数据为 LZMA1 原始流，前面是 4 字节头(LZMA SDK 版本 9.04、属性长度)和 5 字节属性；
+# 参数取 liblzma 默认预设的值，属性按 lc/lp/pb 和字典大小编码
+_LZMA_DICT_SIZE = 1 << 23
+_LZMA_LC, _LZMA_LP, _LZMA_PB = 3, 0, 2
+_LZMA_FILTERS = [{'id': lzma.FILTER_LZMA1, 'dict_size': _LZMA_DICT_SIZE,
+                  'lc': _LZMA_LC, 'lp': _LZMA_LP, 'pb': _LZMA_PB}]
+_LZMA_PROPS = struct.pack('<BI', (_LZMA_PB * 5 + _LZMA_LP) * 9 + _LZMA_LC, _LZMA_DICT_SIZE)
+_LZMA_HEADER = struct.pack('<BBH', 9, 4, len(_LZMA_PROPS)) + _LZMA_PROPS
+
+
+def _dos_time(mtime):
+    t = time.localtime(max(mtime, 315532800))  # zip 时间最早为 1980 年
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+def _compress_chunks(chunks, codec, level):
+    """压缩数据块，返回 (压缩数据, crc32, 原始大小)"""
+    if codec == CODEC_LZMA:
+        compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+        parts = [_LZMA_HEADER]
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        parts = []
+    crc = 0
+    size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return b"".join(parts), crc, size
+
+
+def _compress_file(path, codec, level):
+    """读取并压缩一个文件；在线程池中执行，zlib/lzma 压缩时释放 GIL"""
+    with open(path, 'rb') as f:
+        return _compress_chunks(iter(lambda: f.read(_READ_CHUNK_SIZE), b""), codec, level)
+
+
+class _ZipWriter:
+    """顺序写入已压缩好的 zip 成员；生成的文件由标准库 zipfile 读取"""
+
+    def __init__(self, f, codec):
+        self.f = f
+        self.method = zipfile.ZIP_LZMA if codec == CODEC_LZMA else zipfile.ZIP_DEFLATED
+        self.version = _LZMA_VERSION if codec == CODEC_LZMA else _DEFLATED_VERSION
+        self.flags = _FLAG_UTF8 | (_FLAG_LZMA_EOS if codec == CODEC_LZMA else 0)
+        self.entries = []
+
+    def write(self, name, data, crc, size, mtime, is_dir=False):
+        if len(self.entries) >= _MAX_ENTRIES:
+            raise ValueError("归档中的文件数过多，请改用其他备份方式")
+        encoded = name.encode('utf-8')
+        offset = self.f.tell()
+        # 不写 zip64 扩展字段，写入后的结束位置(即之后成员和中央目录的偏移)也不能超过 4 GB
+        end = offset + 30 + len(encoded) + len(data)
+        if end > _ZIP64_LIMIT or size > _ZIP64_LIMIT:
+            raise ValueError("归档超过 4 GB，请改用其他备份方式")
+        method = zipfile.ZIP_STORED if is_dir else self.method
+        version = 20 if is_dir else self.version
+        dos_time, dos_date = _dos_time(mtime)
+        self.f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, version, self.flags, method, dos_time, dos_date,
+                                 crc, len(data), size, len(encoded), 0))
+        self.f.write(encoded)
+        self.f.write(data)
+        external_attr = 0x10 if is_dir else 0
+        self.entries.append((encoded, version, method, dos_time, dos_date, crc, len(data), size, external_attr,
+                             offset))
+
+    def close(self):
+        cd_offset = self.f.tell()
+        for encoded, version, method, dos_time, dos_date, crc, csize, size, external_attr, offset in self.entries:
+            self.f.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, version, self.flags, method, dos_time,
+                                     dos_date, crc, csize, size, len(encoded), 0, 0, 0, 0, external_attr, offset))
+            self.f.write(encoded)
+        cd_size = self.f.tell() - cd_offset
+        self.f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.entries), len(self.entries), cd_size,
+                                 cd_offset, 0))
+
+
+def _archive_name(rel_path):
+    return rel_path.replace(os.sep, '/')
+
+
+def create_archive(source, archive_path, codec=CODEC_DEFLATE, level=6, max_workers=None):
+    """把角色目录压缩为 zip 归档，返回 (文件数, 原始字节数, 归档字节数)
+
+    文件由线程池并行压缩，按顺序直接写入归档文件，不生成临时副本；
+    先写入 .tmp 文件，完成后改名，中断时不会留下不完整的归档。
+    """
+    dirs, files = scan_tree(source)
+    max_workers = max_workers or get_copy_workers()
+    rel_paths = sorted(files)
+    index = {_archive_name(rel): [size, mtime_ns] for rel, (size, mtime_ns) in files.items()}
+
+    tmp_path = archive_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            writer = _ZipWriter(f, codec)
+            for rel_dir in sorted(dirs):
+                writer.write(_archive_name(rel_dir) + '/', b"", 0, 0, os.path.getmtime(os.path.join(source, rel_dir)),
+                             is_dir=True)
+
+            batch_size = max_workers * BATCH_PER_WORKER
+            for start in range(0, len(rel_paths), batch_size):
+                batch = rel_paths[start:start + batch_size]
+                results = executor.map(lambda rel: _compress_file(os.path.join(source, rel), codec, level), batch)
+                for rel_path, (data, crc, size) in zip(batch, results):
+                    writer.write(_archive_name(rel_path), data, crc, size, files[rel_path][1] / 1e9)
+
+            index_data = json.dumps(index, ensure_ascii=False).encode('utf-8')
+            writer.write(INDEX_NAME, *_compress_chunks([index_data], codec, level), time.time())
+            writer.close()
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return len(rel_paths), sum(size for size, _ in files.values()), os.path.getsize(archive_path)
+
+
+def _load_index(zf):
+    try:
+        return json.loads(zf.read(INDEX_NAME).decode('utf-8'))
+    except (KeyError, ValueError):
+        return {}
+
+
+def list_archive_files(archive_path):
+    """列出归档中的文件(相对路径，使用 / 分隔)"""
+    with zipfile.ZipFile(archive_path) as zf:
+        return sorted(info.filename for info in zf.infolist() if not info.is_dir() and info.filename != INDEX_NAME)
+
+
+def _extract(zf, info, dest, index):
+    dest_file = os.path.join(dest, *info.filename.split('/'))
+    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+    with zf.open(info) as fsrc, open(dest_file, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, _READ_CHUNK_SIZE)
+    entry = index.get(info.filename)
+    if entry is not None:
+        os.utime(dest_file, ns=(entry[1], entry[1]))
+    else:
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(dest_file, (mtime, mtime))
+
+
+def extract_file(archive_path, name, dest):
+    """只从归档中取出一个文件写入 dest 下的对应位置；zip 按中央目录定位，不读取其他成员"""
+    with zipfile.ZipFile(archive_path) as zf:
+        _extract(zf, zf.getinfo(name), dest, _load_index(zf))
+
+
+def read_archive_listing(archive_path):
+    """读取归档的目录和文件，返回 (目录相对路径集合, {文件相对路径: (大小, 修改时间纳秒)})，只读取中央目录和索引"""
+    dirs = set()
+    files = {}
+    with zipfile.ZipFile(archive_path) as zf:
+        index = _load_index(zf)
+        for info in zf.infolist():
+            if info.filename == INDEX_NAME:
+                continue
+            rel_path = os.path.join(*info.filename.rstrip('/').split('/'))
+            if info.is_dir():
+                dirs.add(rel_path)
+                continue
+            entry = index.get(info.filename)
+            if entry is not None:
+                files[rel_path] = (entry[0], entry[1])
+            else:
+                files[rel_path] = (info.file_size, int(time.mktime(info.date_time + (0, 0, -1)) * 1e9))
+    return dirs, files
+
+
+def restore_archive(archive_path, dest, rel_paths=None):
+    """把归档中的文件写入 dest，返回文件数
+
+    rel_paths 为 None 时写入全部文件(dest 应为空目录或不存在)，否则只写入其中列出的文件。
+    """
+    os.makedirs(dest, exist_ok=True)
+    wanted = None if rel_paths is None else {_archive_name(rel) for rel in rel_paths}
+    count = 0
+    with zipfile.ZipFile(archive_path) as zf:
+        index = _load_index(zf)
+        # 按成员在归档中的位置顺序读取
+        for info in sorted(zf.infolist(), key=lambda i: i.header_offset):
+            if info.filename == INDEX_NAME:
+                continue
+            if info.is_dir():
+                os.makedirs(os.path.join(dest, *info.filename.rstrip('/').split('/')), exist_ok=True)
+                continue
+            if wanted is not None and info.filename not in wanted:
+                continue
+            _extract(zf, info, dest, index)
+            count += 1
+    return count
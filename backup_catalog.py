@@ -0,0 +1,173 @@
+import contextlib
+import os
+import sqlite3
+from datetime import datetime
+
+from app_config import get_app_data_dir
+
+CATALOG_FILE_NAME = 'backup_catalog.sqlite3'
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# 备份方式，与界面中的选项对应
+FORMAT_COPY = 'copy'
+FORMAT_INCREMENTAL = 'incremental'
+FORMAT_ARCHIVE = 'archive'
+FORMAT_PACK = 'pack'
+FORMAT_STORE = 'store'
+
+FORMAT_NAMES = {
+    FORMAT_COPY: "完整复制",
+    FORMAT_INCREMENTAL: "增量快照",
+    FORMAT_ARCHIVE: "压缩归档",
+    FORMAT_PACK: "打包",
+    FORMAT_STORE: "备份库",
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    role_key TEXT NOT NULL,
+    role_path TEXT NOT NULL,
+    role_name TEXT NOT NULL,
+    created TEXT NOT NULL,
+    format TEXT NOT NULL,
+    location TEXT NOT NULL UNIQUE,
+    total_bytes INTEGER NOT NULL,
+    file_count INTEGER NOT NULL,
+    manifest_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_role ON backups (role_key, created);
+CREATE TABLE IF NOT EXISTS imported_roles (
+    role_key TEXT PRIMARY KEY
+);
+'''
+
+
+def get_catalog_path():
+    return os.path.join(get_app_data_dir(), CATALOG_FILE_NAME)
+
+
+def role_key(role_path):
+    return os.path.normcase(os.path.abspath(role_path))
+
+
+class BackupRecord:
+    """备份目录中的一条记录"""
+
+    __slots__ = ('id', 'role_path', 'role_name', 'created', 'format', 'location', 'total_bytes', 'file_count',
+                 'manifest_hash')
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.role_path = row['role_path']
+        self.role_name = row['role_name']
+        self.created = datetime.strptime(row['created'], TIMESTAMP_FORMAT)
+        self.format = row['format']
+        self.location = row['location']  # 备份目录、归档文件或备份库清单文件
+        self.total_bytes = row['total_bytes']
+        self.file_count = row['file_count']
+        self.manifest_hash = row['manifest_hash']
+
+    @property
+    def format_name(self):
+        return FORMAT_NAMES.get(self.format, self.format)
+
+
+class BackupCatalog:
+    """本地备份目录(sqlite)：每次创建备份时记录，恢复时列出备份不需要扫描角色所在目录"""
+
+    def __init__(self, path=None):
+        self.path = path or get_catalog_path()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # 每次操作使用独立的连接，可在任意线程中调用
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, role_path, role_name, backup_format, location, total_bytes, file_count, manifest_hash=None,
+            created=None):
+        created = created or datetime.now()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO backups (role_key, role_path, role_name, created, format, location, '
+                'total_bytes, file_count, manifest_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (role_key(role_path), os.path.abspath(role_path), role_name, created.strftime(TIMESTAMP_FORMAT),
+                 backup_format, os.path.abspath(location), total_bytes, file_count, manifest_hash))
+
+    def remove(self, location):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM backups WHERE location = ?', (os.path.abspath(location),))
+
+    def list(self, role_path, backup_format=None):
+        """列出角色的备份，最新的在前"""
+        query = 'SELECT * FROM backups WHERE role_key = ?'
+        params = [role_key(role_path)]
+        if backup_format is not None:
+            query += ' AND format = ?'
+            params.append(backup_format)
+        query += ' ORDER BY created DESC, id DESC'
+        with self._connect() as conn:
+            return [BackupRecord(row) for row in conn.execute(query, params)]
+
+    def list_all(self):
+        """列出所有角色的备份，最新的在前"""
+        with self._connect() as conn:
+            return [BackupRecord(row) for row in conn.execute('SELECT * FROM backups ORDER BY created DESC, id DESC')]
+
+    def is_imported(self, role_path):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM imported_roles WHERE role_key = ?',
+                                (role_key(role_path),)).fetchone() is not None
+
+    def import_existing(self, role_path, role_name):
+        """导入使用备份目录之前创建的目录备份(角色名_手动备份_时间戳、角色名_备份_时间戳)，每个角色只执行一次"""
+        from sync_engine import scan_tree
+
+        parent = os.path.dirname(role_path)
+        found = []
+        try:
+            entries = os.listdir(parent)
+        except OSError:
+            entries = []
+        for entry in entries:
+            for marker in ("_手动备份_", "_备份_"):
+                prefix = f"{role_name}{marker}"
+                if not entry.startswith(prefix):
+                    continue
+                entry_path = os.path.join(parent, entry)
+                try:
+                    created = datetime.strptime(entry[len(prefix):], TIMESTAMP_FORMAT)
+                except ValueError:
+                    # 不是本工具生成的目录名
+                    continue
+                if os.path.isdir(entry_path):
+                    found.append((entry_path, created))
+                break
+
+        known = {record.location for record in self.list(role_path)}
+        for entry_path, created in found:
+            if os.path.abspath(entry_path) in known:
+                continue
+            _, files = scan_tree(entry_path)
+            self.add(role_path, role_name, FORMAT_COPY, entry_path, sum(size for size, _ in files.values()),
+                     len(files), created=created)
+
+        # 备份库中已有的备份
+        from backup_store import BackupStore
+        from manifest import manifest_digest
+        for snapshot in BackupStore().list_snapshots(role_path):
+            if os.path.abspath(snapshot.path) not in known:
+                self.add(role_path, snapshot.role_name, FORMAT_STORE, snapshot.path, snapshot.total_bytes,
+                         len(snapshot.files), manifest_digest(snapshot.files), created=snapshot.timestamp)
+                found.append((snapshot.path, snapshot.timestamp))
+        with self._connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO imported_roles (role_key) VALUES (?)', (role_key(role_path),))
+        return len(found)
@@ -0,0 +1,207 @@
+import os
+import shutil
+
+from app_config import load_config
+from backup_catalog import FORMAT_ARCHIVE, FORMAT_PACK, FORMAT_STORE
+
+# 未配置时“清理旧备份”使用的策略
+DEFAULT_RETENTION = {
+    'keep_last': 5,
+    'keep_daily': 7,
+    'keep_weekly': 4,
+}
+
+
+class RetentionPolicy:
+    """备份保留策略
+
+    keep_last: 保留最近的 N 个备份；keep_daily/keep_weekly: 最近 N 个有备份的日期/周各保留当天(当周)最新的一个；
+    max_mb: 每个角色的备份最多占用的空间，max_account_mb: 每个账号的备份最多占用的空间，
+    超出时从最旧的备份开始删除。每个角色最新的备份始终保留。
+    """
+
+    def __init__(self, keep_last=None, keep_daily=None, keep_weekly=None, max_mb=None, max_account_mb=None,
+                 auto=False):
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.max_account_bytes = int(max_account_mb * 1024 * 1024) if max_account_mb else None
+        self.auto = auto  # 每次备份后自动在后台清理
+
+    @classmethod
+    def from_config(cls, config=None):
+        """读取 config.json 的 backup.retention，未配置的项使用 DEFAULT_RETENTION 中的值"""
+        if config is None:
+            config = load_config()
+        options = config.get('backup', {}).get('retention')
+        if not isinstance(options, dict):
+            options = {}
+        options = {**DEFAULT_RETENTION, **options}
+        return cls(
+            keep_last=options.get('keep_last'),
+            keep_daily=options.get('keep_daily'),
+            keep_weekly=options.get('keep_weekly'),
+            max_mb=options.get('max_mb'),
+            max_account_mb=options.get('max_account_mb'),
+            auto=bool(options.get('auto', False)),
+        )
+
+    @property
+    def has_keep_rules(self):
+        """是否设置了按数量或日期保留的规则，未设置时每个角色只保留最新的一个备份"""
+        return bool(self.keep_last or self.keep_daily or self.keep_weekly)
+
+    def select(self, records):
+        """按数量和日期规则选出保留的备份，records 为同一角色的备份(最新的在前)"""
+        keep = set()
+        if self.keep_last:
+            keep.update(record.location for record in records[:self.keep_last])
+        for limit, period in ((self.keep_daily, lambda r: r.created.date()),
+                              (self.keep_weekly, lambda r: r.created.isocalendar()[:2])):
+            if not limit:
+                continue
+            seen = set()
+            for record in records:
+                key = period(record)
+                if key in seen:
+                    continue
+                seen.add(key)
+                keep.add(record.location)
+                if len(seen) >= limit:
+                    break
+        if records:
+            keep.add(records[0].location)
+        return keep
+
+
+class SpaceAccounting:
+    """计算备份实际占用的磁盘空间，多个备份共享的数据只计算一次
+
+    目录备份中硬链接到同一文件的(如增量快照)按 (设备, inode) 去重；
+    备份库中的备份按内容哈希去重；归档和打包备份按文件大小计算。
+    """
+
+    def __init__(self):
+        self._units = {}  # 备份位置 -> {数据标识: 字节数}
+        self._store = None
+
+    def units(self, record):
+        units = self._units.get(record.location)
+        if units is None:
+            units = self._units[record.location] = self._compute_units(record)
+        return units
+
+    def _compute_units(self, record):
+        units = {}
+        if record.format == FORMAT_STORE:
+            from backup_store import BackupStore
+            if self._store is None:
+                self._store = BackupStore()
+            try:
+                snapshot = self._store.load_snapshot(record.location)
+            except (OSError, ValueError, KeyError):
+                return units
+            units[('file', record.location)] = os.path.getsize(record.location)
+            for _, _, digest in snapshot.files.values():
+                units[('object', digest)] = self._store.object_size(digest)
+        elif record.format in (FORMAT_ARCHIVE, FORMAT_PACK):
+            try:
+                units[('file', record.location)] = os.path.getsize(record.location)
+            except OSError:
+                pass
+        else:
+            for dirpath, _, filenames in os.walk(record.location):
+                for name in filenames:
+                    try:
+                        st = os.stat(os.path.join(dirpath, name), follow_symlinks=False)
+                    except OSError:
+                        continue
+                    units[('inode', st.st_dev, st.st_ino)] = st.st_size
+        return units
+
+    def usage(self, records):
+        """records 合计占用的字节数"""
+        total = {}
+        for record in records:
+            total.update(self.units(record))
+        return sum(total.values())
+
+
+def account_of_role(role_path):
+    """角色目录位于 userdata/账号/大区/服务器/角色名，由路径得出账号"""
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(os.path.normpath(role_path)))))
+
+
+def plan_retention(records, policy, account_of=None, accounting=None):
+    """计算需要删除的备份，返回 (需删除的备份, 清理前占用字节, 清理后占用字节)
+
+    records 为所有角色的备份；account_of(角色路径) 返回角色所属账号，用于按账号限制空间。
+    """
+    accounting = accounting or SpaceAccounting()
+    by_role = {}
+    for record in sorted(records, key=lambda r: r.created, reverse=True):
+        by_role.setdefault(record.role_path, []).append(record)
+
+    kept = {}  # 角色路径 -> 保留的备份(最新的在前)
+    for role_path, role_records in by_role.items():
+        keep = policy.select(role_records)
+        kept[role_path] = [record for record in role_records if record.location in keep]
+        if policy.max_bytes:
+            _trim_to_size([kept[role_path]], policy.max_bytes, accounting)
+
+    if policy.max_account_bytes and account_of is not None:
+        by_account = {}
+        for role_path, role_kept in kept.items():
+            by_account.setdefault(account_of(role_path), []).append(role_kept)
+        for account, groups in by_account.items():
+            if account is not None:
+                _trim_to_size(groups, policy.max_account_bytes, accounting)
+
+    keep_locations = {record.location for role_kept in kept.values() for record in role_kept}
+    remove = [record for record in records if record.location not in keep_locations]
+    before = accounting.usage(records)
+    after = accounting.usage([record for record in records if record.location in keep_locations])
+    return remove, before, after
+
+
+def _trim_to_size(groups, max_bytes, accounting):
+    """从各组(每组为一个角色保留的备份，最新的在前)中删除最旧的备份，直到合计不超过 max_bytes；每组至少保留一个"""
+    while accounting.usage([record for group in groups for record in group]) > max_bytes:
+        candidates = [group for group in groups if len(group) > 1]
+        if not candidates:
+            break
+        oldest_group = min(candidates, key=lambda group: group[-1].created)
+        oldest_group.pop()
+
+
+def delete_backup(record):
+    """删除一个备份的数据及其文件清单；备份库中的文件内容需随后调用 BackupStore.collect_garbage 清理"""
+    from manifest import remove_manifest
+    if os.path.exists(record.location):
+        if record.format == FORMAT_STORE:
+            from backup_store import BackupStore
+            BackupStore().delete_snapshot(record.location)
+        elif os.path.isdir(record.location):
+            shutil.rmtree(record.location)
+        else:
+            os.remove(record.location)
+    remove_manifest(record.location)
+
+
+def apply_retention(remove, catalog):
+    """删除备份并从备份目录中移除记录，返回删除失败的 [(备份位置, 错误信息)]"""
+    errors = []
+    store_changed = False
+    for record in remove:
+        try:
+            delete_backup(record)
+        except OSError as e:
+            errors.append((record.location, str(e)))
+            continue
+        catalog.remove(record.location)
+        store_changed = store_changed or record.format == FORMAT_STORE
+    if store_changed:
+        from backup_store import BackupStore
+        BackupStore().collect_garbage()
+    return errors
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app_config import get_app_data_dir, load_config
+from copy_executor import get_copy_workers
+from manifest import HASH_CHUNK_SIZE, refresh_manifest
+from sync_engine import scan_tree
+
+STORE_DIR_NAME = 'backup_store'
+SNAPSHOT_VERSION = 1
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def get_store_dir():
+    """备份库目录，可在 config.json 的 backup.store_dir 中指定(如与游戏位于同一磁盘)"""
+    store_dir = load_config().get('backup', {}).get('store_dir')
+    return store_dir or os.path.join(get_app_data_dir(), STORE_DIR_NAME)
+
+
+# 同一备份库的备份与清理互斥，避免清理删除正在创建的备份将要引用的文件内容
+_store_locks = {}
+_store_locks_guard = threading.Lock()
+
+
+def _get_store_lock(store_dir):
+    key = os.path.normcase(os.path.abspath(store_dir))
+    with _store_locks_guard:
+        return _store_locks.setdefault(key, threading.Lock())
+
+
+def _role_key(role_path):
+    return hashlib.sha1(os.path.normcase(os.path.abspath(role_path)).encode('utf-8')).hexdigest()
+
+
+class Snapshot:
+    """备份库中的一次备份"""
+
+    def __init__(self, path, role_path, role_name, timestamp, files, dirs):
+        self.path = path  # 备份清单文件
+        self.role_path = role_path
+        self.role_name = role_name
+        self.timestamp = timestamp
+        self.files = files  # 相对路径 -> (大小, 修改时间纳秒, 哈希)
+        self.dirs = dirs
+
+    @property
+    def total_bytes(self):
+        return sum(info[0] for info in self.files.values())
+
+
+class BackupStore:
+    """按内容寻址的备份库：文件按哈希只保存一份，每次备份只是一份指向这些文件的清单
+
+    objects/<哈希前两位>/<哈希> 保存文件内容；snapshots/<角色路径哈希>/<时间戳>.json 保存备份清单。
+    同一角色多次备份时，未变化的文件既不重新计算哈希(沿用目录清单)，也不重新保存。
+    """
+
+    def __init__(self, store_dir=None, max_workers=None):
+        self.store_dir = store_dir or get_store_dir()
+        self.max_workers = max_workers or get_copy_workers()
+        self._lock = _get_store_lock(self.store_dir)
+
+    def _object_path(self, digest):
+        return os.path.join(self.store_dir, 'objects', digest[:2], digest)
+
+    def _snapshot_dir(self, role_path):
+        return os.path.join(self.store_dir, 'snapshots', _role_key(role_path))
+
+    def _has_object(self, digest, size):
+        """库中是否已有该内容；大小与清单不符的视为已损坏，需重新保存"""
+        try:
+            return os.path.getsize(self._object_path(digest)) == size
+        except OSError:
+            return False
+
+    def _store_object(self, src, digest, size):
+        """保存文件内容，返回实际的哈希；复制的同时计算哈希，防止清单中的哈希已过期"""
+        object_path = self._object_path(digest)
+        if self._has_object(digest, size):
+            return digest
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            while True:
+                chunk = fsrc.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                fdst.write(chunk)
+        actual = hasher.hexdigest()
+        if actual != digest:
+            object_path = self._object_path(actual)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(tmp_path, object_path)
+        return actual
+
+    def create_snapshot(self, role_path, role_name):
+        """备份角色目录，返回 (Snapshot, 新保存的字节数)
+
+        从检查已有内容到写入备份清单期间持有备份库的锁，collect_garbage 不会删除其中引用的内容。
+        """
+        manifest = refresh_manifest(role_path)
+        dirs, _ = scan_tree(role_path)
+        with self._lock:
+            return self._create_snapshot_locked(role_path, role_name, manifest, dirs)
+
+    def _create_snapshot_locked(self, role_path, role_name, manifest, dirs):
+        new_bytes = 0
+        missing = []
+        for rel_path, (size, _, digest) in manifest.items():
+            if not self._has_object(digest, size):
+                missing.append(rel_path)
+                new_bytes += size
+
+        files = dict(manifest)
+        if missing:
+            def store(rel_path):
+                size, mtime_ns, digest = manifest[rel_path]
+                actual = self._store_object(os.path.join(role_path, rel_path), digest, size)
+                return rel_path, (size, mtime_ns, actual)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for rel_path, info in executor.map(store, missing):
+                    files[rel_path] = info
+
+        timestamp = datetime.now()
+        snapshot_dir = self._snapshot_dir(role_path)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        snapshot_path = os.path.join(snapshot_dir, f"{timestamp.strftime(TIMESTAMP_FORMAT)}.json")
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'role_path': os.path.abspath(role_path),
+            'role_name': role_name,
+            'timestamp': timestamp.strftime(TIMESTAMP_FORMAT),
+            'dirs': sorted(dirs),
+            'files': {rel: list(info) for rel, info in files.items()},
+        }
+        tmp_path = snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, snapshot_path)
+        return Snapshot(snapshot_path, data['role_path'], role_name, timestamp, files, data['dirs']), new_bytes
+
+    def load_snapshot(self, snapshot_path):
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的备份版本: {snapshot_path}")
+        return Snapshot(snapshot_path, data['role_path'], data['role_name'],
+                        datetime.strptime(data['timestamp'], TIMESTAMP_FORMAT),
+                        {rel: tuple(info) for rel, info in data['files'].items()}, data['dirs'])
+
+    def list_snapshots(self, role_path):
+        """列出角色的所有备份，最新的在前；损坏的清单跳过"""
+        snapshot_dir = self._snapshot_dir(role_path)
+        try:
+            names = [name for name in os.listdir(snapshot_dir) if name.endswith('.json')]
+        except OSError:
+            return []
+        snapshots = []
+        for name in names:
+            try:
+                snapshots.append(self.load_snapshot(os.path.join(snapshot_dir, name)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取备份清单 {name} 失败: {str(e)}")
+        snapshots.sort(key=lambda s: s.timestamp, reverse=True)
+        return snapshots
+
+    def restore_snapshot(self, snapshot, dest):
+        """把备份中的文件写入 dest(dest 应为空目录或不存在)，恢复修改时间"""
+        os.makedirs(dest, exist_ok=True)
+        for rel_dir in sorted(snapshot.dirs, key=lambda p: (p.count(os.sep), p)):
+            os.makedirs(os.path.join(dest, rel_dir), exist_ok=True)
+        self.restore_files(snapshot, list(snapshot.files), dest)
+
+    def restore_files(self, snapshot, rel_paths, dest):
+        """只把备份中的 rel_paths 写入 dest，所在目录需已存在"""
+        def restore(rel_path):
+            _, mtime_ns, digest = snapshot.files[rel_path]
+            dest_file = os.path.join(dest, rel_path)
+            shutil.copyfile(self._object_path(digest), dest_file)
+            os.utime(dest_file, ns=(mtime_ns, mtime_ns))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(restore, rel_paths))
+
+    def object_size(self, digest):
+        try:
+            return os.path.getsize(self._object_path(digest))
+        except OSError:
+            return 0
+
+    def delete_snapshot(self, snapshot_path):
+        """删除备份清单；文件内容可能被其他备份引用，需调用 collect_garbage 清理"""
+        os.remove(snapshot_path)
+
+    def collect_garbage(self):
+        """删除不再被任何备份引用的文件内容，返回释放的字节数；与 create_snapshot 互斥"""
+        with self._lock:
+            return self._collect_garbage_locked()
+
+    def _collect_garbage_locked(self):
+        referenced = set()
+        snapshots_dir = os.path.join(self.store_dir, 'snapshots')
+        for dirpath, _, filenames in os.walk(snapshots_dir):
+            for name in filenames:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    snapshot = self.load_snapshot(os.path.join(dirpath, name))
+                except (OSError, ValueError, KeyError):
+                    # 无法读取的清单可能引用任何内容，为安全起见不清理
+                    return 0
+                referenced.update(info[2] for info in snapshot.files.values())
+
+        freed = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.store_dir, 'objects')):
+            for name in filenames:
+                # 正在写入的临时文件(带 .tmp 后缀)不清理
+                if name in referenced or '.' in name:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    pass
+        return freed
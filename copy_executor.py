@@ -0,0 +1,188 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app_config import load_config
+
+# 超过该大小的文件分块复制，复制过程中也能更新进度
+CHUNKED_COPY_MIN_BYTES = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 进度回调的最短间隔(秒)，大文件复制期间按该间隔回调
+PROGRESS_INTERVAL = 0.2
+
+# 计算速度的时间窗口(秒)
+SPEED_WINDOW = 3.0
+
+
+class CopyCancelled(Exception):
+    """复制被取消；已完成的文件保留在目标中"""
+
+
+def get_copy_workers():
+    """复制线程数，可在 config.json 的 copy.workers 中配置"""
+    workers = load_config().get('copy', {}).get('workers')
+    if isinstance(workers, int) and workers > 0:
+        return workers
+    return min(16, (os.cpu_count() or 1) * 2)
+
+
+class TransferProgress:
+    """按字节统计复制进度，可由多个线程同时更新"""
+
+    def __init__(self, total_files, total_bytes):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.done_bytes = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._samples = deque([(self._start, 0)])  # (时间, 已复制字节)
+
+    def add(self, files, nbytes):
+        with self._lock:
+            self.done_files += files
+            self.done_bytes += nbytes
+
+    @property
+    def percent(self):
+        if self.total_bytes:
+            return self.done_bytes / self.total_bytes * 100
+        return self.done_files / self.total_files * 100 if self.total_files else 100
+
+    def speed(self):
+        """最近几秒的平均速度(字节/秒)"""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, self.done_bytes))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= SPEED_WINDOW:
+                self._samples.popleft()
+            first_time, first_bytes = self._samples[0]
+            done_bytes = self.done_bytes
+        elapsed = now - first_time
+        return (done_bytes - first_bytes) / elapsed if elapsed > 0 else 0
+
+    def format(self):
+        """进度文本，如: 已复制 12/50 文件, 120.5/300.0 MB, 25.3 MB/s, 剩余约 00:07"""
+        speed = self.speed()
+        text = (f"已复制 {self.done_files}/{self.total_files} 文件, "
+                f"{self.done_bytes / (1024 * 1024):.1f}/{self.total_bytes / (1024 * 1024):.1f} MB, "
+                f"{speed / (1024 * 1024):.1f} MB/s")
+        remaining = self.total_bytes - self.done_bytes
+        if speed > 0 and remaining > 0:
+            seconds = int(remaining / speed)
+            text += f", 剩余约 {seconds // 60:02d}:{seconds % 60:02d}"
+        return text
+
+
+def _copy_file(src, dst, size, progress, cancel_event=None):
+    """复制单个文件并保留修改时间，大文件分块复制并随时更新已复制字节
+
+    已取消时不再开始复制，返回 False。
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return False
+    if progress is None or size < CHUNKED_COPY_MIN_BYTES:
+        shutil.copy2(src, dst)
+        if progress is not None:
+            progress.add(1, size)
+        return True
+
+    copied = 0
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            while True:
+                chunk = fsrc.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                fdst.write(chunk)
+                copied += len(chunk)
+                progress.add(0, len(chunk))
+        shutil.copystat(src, dst)
+    finally:
+        # 复制失败时也计入剩余字节，使总进度能够到达 100%
+        progress.add(1, size - copied)
+    return True
+
+
+class CopyExecutor:
+    """并行复制文件：先按顺序创建目录，再由线程池复制文件，每个文件的错误单独记录"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or get_copy_workers()
+
+    def run(self, source_root, target_root, make_dirs, files, on_progress=None, cancel_event=None, journal=None):
+        """复制 files 中的文件 [(相对路径, 大小)]，返回 [(相对路径, 错误信息)]
+
+        make_dirs 为需创建的目录(相对路径，浅的在前)；
+        on_progress(TransferProgress) 在调用线程中于文件完成时调用，大文件复制期间也会定时调用。
+        cancel_event 被设置后不再开始新的文件，等正在复制的文件完成后抛出 CopyCancelled；
+        journal 为 MigrationJournal 时跳过其中已完成的文件，并记录新完成的文件。
+        """
+        os.makedirs(target_root, exist_ok=True)
+        for rel_dir in make_dirs:
+            os.makedirs(os.path.join(target_root, rel_dir), exist_ok=True)
+
+        errors = []
+        if not files:
+            return errors
+
+        progress = TransferProgress(len(files), sum(size for _, size in files))
+        if journal is not None:
+            pending = []
+            for rel_path, size in files:
+                if journal.is_done(rel_path, os.path.join(target_root, rel_path),
+                                   os.path.join(source_root, rel_path)):
+                    progress.add(1, size)
+                else:
+                    pending.append((rel_path, size))
+            files = pending
+
+        completed = queue.Queue()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(files)))) as executor:
+            for rel_path, size in files:
+                future = executor.submit(_copy_file, os.path.join(source_root, rel_path),
+                                         os.path.join(target_root, rel_path), size, progress, cancel_event)
+                future.add_done_callback(lambda f, rel=rel_path: completed.put((rel, f)))
+
+            last_report = 0
+            remaining = len(files)
+            cancelled = False
+            while remaining:
+                try:
+                    rel_path, future = completed.get(timeout=PROGRESS_INTERVAL)
+                except queue.Empty:
+                    pass
+                else:
+                    remaining -= 1
+                    error = future.exception()
+                    if error is not None:
+                        errors.append((rel_path, str(error)))
+                    elif not future.result():
+                        cancelled = True
+                    elif journal is not None:
+                        journal.record(rel_path, os.path.join(target_root, rel_path),
+                                       os.path.join(source_root, rel_path))
+                # 回调按时间间隔合并，避免每个小文件都回调一次
+                now = time.monotonic()
+                if on_progress is not None and (now - last_report >= PROGRESS_INTERVAL or not remaining):
+                    last_report = now
+                    on_progress(progress)
+
+        if journal is not None:
+            journal.flush()
+        if cancelled:
+            raise CopyCancelled()
+        return errors
+
+
+def format_copy_errors(errors, limit=5):
+    """把复制错误整理为日志文本"""
+    lines = [f"{rel_path}: {error}" for rel_path, error in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"... 另有 {len(errors) - limit} 个文件")
+    return "\n".join(lines)
@@ -1,37 +1,140 @@
+import glob
 import os
 import platform
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app_config import load_config
+from folder_size import bytes_to_mb, get_folder_sizer
+from prune_rules import PruneRules
+
+# 环境变量，可指定一个或多个游戏安装路径(用 os.pathsep 分隔)
+GAME_PATH_ENV = 'JX3_GAME_PATH'
+
+# 快速探测时在每个盘符(或 Wine 的 drive_c)下检查的常见安装目录，按可能性排序
+PROBE_SUBDIRS = [
+    '',
+    'Program Files',
+    'Program Files (x86)',
+    'Games',
+    'Game',
+    '游戏',
+    '西山居',
+    'Seasun',
+    'JX3',
+    '剑网3',
+    'WeGameApps',
+    os.path.join('Program Files', 'WeGame'),
+    os.path.join('Program Files (x86)', 'WeGame'),
+]
+
+# Wine/Proton 前缀，glob 形式，展开后为 drive_c 目录
+WINE_PREFIX_PATTERNS = [
+    os.path.join('~', '.wine', 'drive_c'),
+    os.path.join('~', '.local', 'share', 'Steam', 'steamapps', 'compatdata', '*', 'pfx', 'drive_c'),
+    os.path.join('~', '.steam', 'steam', 'steamapps', 'compatdata', '*', 'pfx', 'drive_c'),
+    os.path.join('~', '.var', 'app', 'com.valvesoftware.Steam', 'data', 'Steam', 'steamapps', 'compatdata', '*',
+                 'pfx', 'drive_c'),
+    os.path.join('~', '.local', 'share', 'bottles', 'bottles', '*', 'drive_c'),
+    os.path.join('~', 'Games', '*', 'drive_c'),
+]
 
 def get_folder_size(path):
-    total_size = 0
-    error_msg = ""
+    # 使用共享的并行计算器，目录未变化时直接使用缓存结果
+    size, error_msg = get_folder_sizer().get_size(path)
+    return bytes_to_mb(size), error_msg
+
+
+def _split_parts(target_rel_path):
+    """按 / 和 \\ 拆分相对路径，与当前系统的分隔符无关"""
+    return [part for part in re.split(r'[\\/]+', target_rel_path) if part]
+
+
+def _split_rel_path(target_rel_path):
+    """把相对路径拆成逐级比较用的目录名"""
+    return [os.path.normcase(part) for part in _split_parts(target_rel_path)]
+
+
+def _scan_level(dirpath, matched, depth, components, found, rules=None, pruned=None):
+    """扫描单层目录，命中的目标路径写入 found，返回需要继续遍历的子目录"""
+    children = []
     try:
-        for dirpath, _, filenames in os.walk(path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                # 跳过符号链接和无法访问的文件
-                if os.path.islink(file_path):
-                    continue
-                try:
-                    total_size += os.path.getsize(file_path)
-                except (PermissionError, FileNotFoundError):
-                    error_msg = "部分文件无法访问，大小可能不准确"
-                    continue
-    except PermissionError:
-        return 0, "无权限访问该文件夹"
-    except Exception as e:
-        return 0, f"计算大小失败: {str(e)}"
-
-    # 转换为MB并保留两位小数
-    size_mb = round(total_size / (1024 * 1024), 2)
-    return size_mb, error_msg
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        return children
+    except OSError as e:
+        print(f"访问目录 {dirpath} 时出错: {str(e)}")
+        return children
 
+    parent_dev = None
+    if rules is not None and rules.needs_parent_device():
+        try:
+            parent_dev = os.stat(dirpath).st_dev
+        except OSError:
+            pass
 
-# noinspection SpellCheckingInspection
-def find_target_directories(target_rel_path):
+    last = len(components) - 1
+    for entry in entries:
+        try:
+            # 目录类型直接来自 scandir 结果；不跟随符号链接，与 os.walk 一致
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+        except OSError:
+            continue
 
-    found_dirs = []
+        name = os.path.normcase(entry.name)
+        if name == components[matched]:
+            progress = matched + 1
+        elif name == components[0]:
+            progress = 1
+        else:
+            progress = 0
 
-    # 获取系统根目录
+        if progress > last:
+            # 命中目标路径，不再向下遍历
+            found.append(entry.path)
+            continue
+
+        # 在进入子目录之前按规则剪枝
+        if rules is not None:
+            rule = rules.match(entry, depth + 1, parent_dev)
+            if rule is not None:
+                if pruned is not None:
+                    pruned[rule] += 1
+                continue
+        children.append((entry.path, progress, depth + 1))
+    return children
+
+
+def _crawl(starts, components, rules=None, on_found=None, stop_event=None):
+    """用 os.scandir 深度优先遍历，只比较已读入的目录项，不额外 stat"""
+    found = []
+    pruned = Counter()
+    # 栈元素: (目录路径, 已匹配的目标层级数, 相对根目录的深度)
+    stack = list(starts)
+    while stack:
+        # 每处理一个目录检查一次是否需要停止
+        if stop_event is not None and stop_event.is_set():
+            break
+        dirpath, matched, depth = stack.pop()
+        count = len(found)
+        stack.extend(_scan_level(dirpath, matched, depth, components, found, rules, pruned))
+        if on_found is not None:
+            for path in found[count:]:
+                on_found(path)
+    found.sort()
+    if rules is not None:
+        rules.record(pruned)
+    return found
+
+
+def _get_search_roots():
+    """获取系统根目录"""
     if platform.system() == 'Windows':
         roots = []
         for drive in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
@@ -40,25 +143,178 @@ def find_target_directories(target_rel_path):
                 roots.append(drive_path)
     else:
         roots = ['/']
+    return roots
 
-    # 遍历搜索
-    find_path_count = 0
+
+def _probe_bases(config):
+    """生成快速探测的候选目录，按可能性排序"""
+    # 1. 环境变量与配置文件中指定的路径
+    explicit = [path for path in os.environ.get(GAME_PATH_ENV, '').split(os.pathsep) if path]
+    explicit.extend(config.get('game_paths', []))
+    search = config.get('search', {})
+    extra_roots = list(search.get('probe_roots', []))
+
+    # 2. 各盘符；非 Windows 系统上为挂载的磁盘与 Wine/Proton 前缀
+    drive_roots = []
+    if platform.system() == 'Windows':
+        drive_roots.extend(_get_search_roots())
+    else:
+        for pattern in WINE_PREFIX_PATTERNS:
+            drive_roots.extend(sorted(glob.glob(os.path.expanduser(pattern))))
+        wine_prefix = os.environ.get('WINEPREFIX')
+        if wine_prefix:
+            drive_roots.insert(0, os.path.join(wine_prefix, 'drive_c'))
+        drive_roots.extend(sorted(glob.glob('/mnt/*')))
+        drive_roots.extend(sorted(glob.glob('/media/*/*')))
+        drive_roots.extend(sorted(glob.glob('/run/media/*/*')))
+        drive_roots.append(os.path.expanduser('~'))
+
+    bases = [os.path.expanduser(path) for path in explicit]
+    for root in extra_roots + drive_roots:
+        root = os.path.expanduser(root)
+        for subdir in PROBE_SUBDIRS:
+            bases.append(os.path.join(root, subdir) if subdir else root)
+    return bases
+
+
+def probe_known_locations(target_rel_path, config=None):
+    """快速探测常见安装位置，返回找到的目标路径(按可能性排序)"""
+    parts = _split_parts(target_rel_path)
+    if not parts:
+        return []
+    components = [os.path.normcase(part) for part in parts]
+    if config is None:
+        config = load_config()
+
+    found = []
+    seen = set()
+    for base in _probe_bases(config):
+        # 指定的路径本身可能就是目标目录
+        base_parts = _split_rel_path(os.path.normpath(base))
+        if base_parts[-len(components):] == components:
+            candidate = os.path.normpath(base)
+        else:
+            candidate = os.path.normpath(os.path.join(base, *parts))
+
+        key = os.path.normcase(candidate)
+        if key in seen:
+            continue
+        seen.add(key)
+        if os.path.isdir(candidate):
+            found.append(candidate)
+    return found
+
+
+def _crawl_roots(roots, components, rules, max_workers=None, on_found=None, stop_event=None):
+    """完整遍历所有根目录"""
+    workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+
+    # 每个根目录(盘符)一个任务；只有一个根目录时(如 Linux 的 /)按一级子目录拆分，以利用多核
+    tasks = []
+    root_matches = []
+    root_pruned = Counter()
     for root in roots:
         print(f"正在搜索: {root}...")
-        for dirpath, _, _ in os.walk(root):
+        if len(roots) == 1:
+            for child in _scan_level(root, 0, 0, components, root_matches, rules, root_pruned):
+                tasks.append((root, [child]))
+        else:
+            tasks.append((root, [(root, 0, 0)]))
+    rules.record(root_pruned)
+    if on_found is not None:
+        for path in root_matches:
+            on_found(path)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks) or 1))) as executor:
+        futures = [(root, executor.submit(_crawl, starts, components, rules, on_found, stop_event))
+                   for root, starts in tasks]
+
+        # 按根目录顺序汇总结果
+        matches = sorted(root_matches)
+        for root, future in futures:
             try:
-                # 检查目标路径是否存在
-                target_path = os.path.join(dirpath, target_rel_path)
-                if os.path.isdir(target_path):
-                    # 计算找到的文件夹大小
-                    find_path_count += 1
-                    size_mb, error_msg = get_folder_size(target_path)
-                    found_dirs.append((target_path, size_mb, error_msg))
-                    print(f"<{find_path_count}>  找到: {target_path} (大小: {size_mb} MB)")
-            except PermissionError:
-                continue
+                matches.extend(future.result())
             except Exception as e:
-                print(f"访问目录 {dirpath} 时出错: {str(e)}")
+                print(f"搜索 {root} 时出错: {str(e)}")
+
+    print(f"剪枝统计: {rules.format_stats()}")
+    return matches
+
+
+def iter_target_directories(target_rel_path, max_workers=None, rules=None, probe=True, cancel_event=None,
+                            time_budget=None):
+    """边搜索边返回找到的目标路径
+
+    cancel_event 为 threading.Event，设置后搜索尽快停止；
+    time_budget 为搜索时间上限(秒)，超时后停止并只返回已找到的路径。
+    """
+    components = _split_rel_path(target_rel_path)
+    if not components:
+        return
+    deadline = time.monotonic() + time_budget if time_budget else None
+
+    # 先快速探测常见位置，找不到再完整遍历
+    matches = probe_known_locations(target_rel_path) if probe else []
+    if matches:
+        print(f"快速探测找到 {len(matches)} 个路径，跳过完整搜索")
+        yield from matches
+        return
+
+    if rules is None:
+        rules = PruneRules.from_config()
+    results = queue.Queue()
+    stop_event = threading.Event()
+    done = object()
+
+    def run_crawl():
+        try:
+            _crawl_roots(_get_search_roots(), components, rules, max_workers, results.put, stop_event)
+        finally:
+            results.put(done)
+
+    crawl_thread = threading.Thread(target=run_crawl)
+    crawl_thread.daemon = True
+    crawl_thread.start()
+
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                print("搜索已取消")
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"搜索超过时间上限 {time_budget} 秒，已停止")
+                break
+            try:
+                path = results.get(timeout=0.1)
+            except queue.Empty:
                 continue
+            if path is done:
+                break
+            yield path
+    finally:
+        # 调用方提前结束迭代时同样通知工作线程停止
+        stop_event.set()
+
+
+# noinspection SpellCheckingInspection
+def find_target_directories(target_rel_path, max_workers=None, rules=None, probe=True, on_found=None,
+                            cancel_event=None, time_budget=None, with_size=True):
+
+    found_dirs = []
+    find_path_count = 0
+    for target_path in iter_target_directories(target_rel_path, max_workers, rules, probe, cancel_event,
+                                               time_budget):
+        find_path_count += 1
+        if with_size:
+            # 计算找到的文件夹大小
+            size_mb, error_msg = get_folder_size(target_path)
+            print(f"<{find_path_count}>  找到: {target_path} (大小: {size_mb} MB)")
+        else:
+            # 大小由调用方另行异步计算
+            size_mb, error_msg = None, ""
+            print(f"<{find_path_count}>  找到: {target_path}")
+        found_dirs.append((target_path, size_mb, error_msg))
+        if on_found is not None:
+            on_found((target_path, size_mb, error_msg))
 
-    return found_dirs
\ No newline at end of file
+    return found_dirs
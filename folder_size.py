@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FolderSizer:
+    """并行计算文件夹大小：顶层子目录分别交给线程池计算
+
+    不缓存结果：游戏运行时文件会原地增长而目录修改时间不变，按目录缓存的大小会过期。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 协调线程：把一个文件夹拆成子树交给 _pool，避免在工作线程里等待工作线程
+        self._coordinator = ThreadPoolExecutor(max_workers=2)
+
+    def _scan_dir(self, path):
+        """返回 (直接文件大小, 子目录列表, 是否有无法访问的文件)"""
+        file_bytes = 0
+        subdirs = []
+        partial = False
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    # 跳过符号链接；类型来自 scandir 结果，Windows 下大小也无需额外 stat
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        file_bytes += entry.stat(follow_symlinks=False).st_size
+                except (PermissionError, FileNotFoundError):
+                    partial = True
+        return file_bytes, subdirs, partial
+
+    def _size_tree(self, path):
+        """单线程计算一个子树的大小，返回 (字节数, 是否有无法访问的部分)"""
+        total = 0
+        partial = False
+        stack = [path]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                file_bytes, subdirs, dir_partial = self._scan_dir(dirpath)
+            except (PermissionError, FileNotFoundError):
+                partial = True
+                continue
+            total += file_bytes
+            partial = partial or dir_partial
+            stack.extend(subdirs)
+        return total, partial
+
+    def get_size(self, path):
+        """计算文件夹大小(字节)，顶层子目录并行计算，返回 (字节数, 错误信息)"""
+        try:
+            file_bytes, subdirs, partial = self._scan_dir(path)
+        except PermissionError:
+            return 0, "无权限访问该文件夹"
+        except Exception as e:
+            return 0, f"计算大小失败: {str(e)}"
+
+        total = file_bytes
+        futures = [self._pool.submit(self._size_tree, subdir) for subdir in subdirs]
+        for future in futures:
+            try:
+                size, sub_partial = future.result()
+            except Exception:
+                partial = True
+                continue
+            total += size
+            partial = partial or sub_partial
+
+        error_msg = "部分文件无法访问，大小可能不准确" if partial else ""
+        return total, error_msg
+
+    def submit(self, path, callback=None):
+        """异步计算文件夹大小，完成后在工作线程中调用 callback(路径, 大小MB, 错误信息)"""
+        def run():
+            size, error_msg = self.get_size(path)
+            size_mb = bytes_to_mb(size)
+            if callback is not None:
+                callback(path, size_mb, error_msg)
+            return size_mb, error_msg
+
+        return self._coordinator.submit(run)
+
+
+def bytes_to_mb(size):
+    # 转换为MB并保留两位小数
+    return round(size / (1024 * 1024), 2)
+
+
+_default_sizer = None
+_default_lock = threading.Lock()
+
+
+def get_folder_sizer():
+    """获取共享的 FolderSizer"""
+    global _default_sizer
+    with _default_lock:
+        if _default_sizer is None:
+            _default_sizer = FolderSizer()
+        return _default_sizer
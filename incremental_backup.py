@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+
+from copy_executor import CopyExecutor
+from manifest import load_manifest, refresh_manifest
+from staged_sync import link_files
+from sync_engine import MTIME_TOLERANCE_NS, scan_tree
+
+BACKUP_MARKER = '_手动备份_'
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def find_latest_backup(role_path, role_name):
+    """查找角色同级目录中最新的手动备份目录，没有时返回 None"""
+    parent = os.path.dirname(role_path)
+    prefix = f"{role_name}{BACKUP_MARKER}"
+    latest = None
+    try:
+        entries = os.scandir(parent)
+    except OSError:
+        return None
+    with entries:
+        for entry in entries:
+            if not entry.name.startswith(prefix) or not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                timestamp = datetime.strptime(entry.name[len(prefix):], TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            if latest is None or timestamp > latest[0]:
+                latest = (timestamp, entry.path)
+    return latest[1] if latest else None
+
+
+def create_incremental_backup(source, dest, previous, verify_hash=False, max_workers=None):
+    """创建增量快照，返回 (硬链接的文件数, 复制的文件数, 复制的字节数, 复制失败的文件)
+
+    与上一个快照 previous 中大小和修改时间相同的文件(verify_hash 时还要求内容哈希相同)
+    直接硬链接过来，其余文件从 source 复制；快照仍是普通目录，可直接浏览和恢复。
+    """
+    dirs, files = scan_tree(source)
+    _, prev_files = scan_tree(previous) if previous else (set(), {})
+
+    source_manifest = prev_manifest = None
+    if verify_hash and previous:
+        source_manifest = refresh_manifest(source)
+        prev_manifest = refresh_manifest(previous)
+
+    link = []
+    copy = []
+    for rel_path, (size, mtime_ns) in sorted(files.items()):
+        prev_info = prev_files.get(rel_path)
+        same = prev_info is not None and prev_info[0] == size and abs(prev_info[1] - mtime_ns) <= MTIME_TOLERANCE_NS
+        if same and source_manifest is not None:
+            same = source_manifest[rel_path][2] == prev_manifest.get(rel_path, (None, None, None))[2]
+        if same:
+            link.append(rel_path)
+        else:
+            copy.append((rel_path, size))
+
+    os.makedirs(dest)
+    for rel_dir in sorted(dirs, key=lambda p: (p.count(os.sep), p)):
+        os.makedirs(os.path.join(dest, rel_dir), exist_ok=True)
+    fallback = link_files(previous, dest, link) if link else []
+    if fallback:
+        # 文件系统不支持硬链接，从角色目录复制
+        fallback_set = set(fallback)
+        link = [rel for rel in link if rel not in fallback_set]
+        copy.extend((rel, files[rel][0]) for rel in fallback)
+    errors = CopyExecutor(max_workers).run(source, dest, [], copy)
+
+    # 快照的文件清单：链接的文件沿用上一个快照的哈希，复制的文件沿用角色清单的哈希
+    reuse = [manifest for manifest in (source_manifest, prev_manifest) if manifest is not None]
+    if previous:
+        reuse.append(load_manifest(previous))
+    refresh_manifest(dest, reuse=reuse + [load_manifest(source)])
+    return len(link), len(copy), sum(size for _, size in copy), errors
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app_config import get_app_data_dir
+from sync_engine import scan_tree
+
+MANIFEST_DIR_NAME = 'manifests'
+MANIFEST_VERSION = 1
+
+# 需要计算哈希的数据超过该大小时使用进程池，小角色在当前线程计算更快
+PROCESS_POOL_MIN_BYTES = 32 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """计算文件内容的哈希(blake2b-128)，作为进程池任务时需要是模块级函数"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_manifest_path(root):
+    """清单保存在本地数据目录，不写入游戏目录；文件名由目录的绝对路径得出"""
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(root)).encode('utf-8')).hexdigest()
+    return os.path.join(get_app_data_dir(), MANIFEST_DIR_NAME, f"{key}.json")
+
+
+def load_manifest(root):
+    """读取目录的清单，返回 {相对路径: (大小, 修改时间纳秒, 哈希)}"""
+    try:
+        with open(get_manifest_path(root), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return {rel: tuple(info) for rel, info in data.get('files', {}).items()}
+
+
+def save_manifest(root, files):
+    manifest_path = get_manifest_path(root)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    data = {
+        'version': MANIFEST_VERSION,
+        'root': os.path.abspath(root),
+        'files': {rel: list(info) for rel, info in files.items()},
+    }
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def remove_manifest(root):
+    """目录被删除后删除其清单"""
+    try:
+        os.remove(get_manifest_path(root))
+    except OSError:
+        pass
+
+
+def build_manifest(root, previous=None, max_workers=None):
+    """生成目录的清单
+
+    previous 为可沿用哈希的清单列表：大小与修改时间都与其中某项相同的文件直接沿用哈希，不再读取内容。
+    清单可以是同一目录的旧清单，也可以是内容相同的另一目录(如备份的来源角色)的清单。
+    """
+    previous = previous or []
+    _, scanned = scan_tree(root)
+
+    files = {}
+    to_hash = []
+    hash_bytes = 0
+    for rel_path, (size, mtime_ns) in scanned.items():
+        for manifest in previous:
+            old = manifest.get(rel_path)
+            if old is not None and old[0] == size and old[1] == mtime_ns:
+                files[rel_path] = (size, mtime_ns, old[2])
+                break
+        else:
+            to_hash.append(rel_path)
+            hash_bytes += size
+
+    paths = [os.path.join(root, rel_path) for rel_path in to_hash]
+    if hash_bytes >= PROCESS_POOL_MIN_BYTES and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            digests = list(executor.map(hash_file, paths, chunksize=16))
+    else:
+        digests = [hash_file(path) for path in paths]
+
+    for rel_path, digest in zip(to_hash, digests):
+        size, mtime_ns = scanned[rel_path]
+        files[rel_path] = (size, mtime_ns, digest)
+    return files
+
+
+def refresh_manifest(root, reuse=None, max_workers=None):
+    """更新并保存目录的清单，reuse 为可沿用哈希的其他清单列表"""
+    previous = [load_manifest(root)] + list(reuse or [])
+    files = build_manifest(root, previous, max_workers)
+    save_manifest(root, files)
+    return files
+
+
+def manifest_digest(files):
+    """清单的摘要：由各文件的相对路径、大小和内容哈希得出，与修改时间无关，内容相同的目录摘要相同"""
+    digest = hashlib.blake2b(digest_size=16)
+    for rel_path in sorted(files):
+        size, _, file_hash = files[rel_path]
+        digest.update(f"{rel_path}\0{size}\0{file_hash}\n".encode('utf-8'))
+    return digest.hexdigest()
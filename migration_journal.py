@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import time
+
+from app_config import get_app_data_dir
+
+JOURNAL_DIR_NAME = 'journals'
+
+# 日志缓冲的条数和时间，达到任一条件时写入磁盘
+JOURNAL_FLUSH_ENTRIES = 256
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+def get_journal_path(target_path):
+    """每个目标目录同一时间只有一个进行中的迁移，日志文件名由目标目录的绝对路径得出"""
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(target_path)).encode('utf-8')).hexdigest()
+    return os.path.join(get_app_data_dir(), JOURNAL_DIR_NAME, f"{key}.journal")
+
+
+class MigrationJournal:
+    """迁移日志：记录已完成的文件，迁移被取消或中断后再次执行相同的迁移时跳过这些文件
+
+    日志文件第一行为迁移参数，之后每行为一个已完成的文件
+    [相对路径, 大小, 修改时间纳秒, 来源大小, 来源修改时间纳秒]，
+    前两项取自写入后的文件，后两项取自复制或链接的来源文件；恢复时两侧都与磁盘上的文件一致才跳过，
+    否则重新复制。迁移中已完成的步骤(如完全覆盖时删除目标目录)记录为 {"step": 名称}。
+    """
+
+    def __init__(self, source_path, target_path, mode, staged):
+        self.path = get_journal_path(target_path)
+        self.header = {
+            'source': os.path.abspath(source_path),
+            'target': os.path.abspath(target_path),
+            'mode': mode,
+            'staged': bool(staged),
+        }
+        self.done = {}  # 相对路径 -> (大小, 修改时间纳秒, 来源大小, 来源修改时间纳秒)
+        self.steps = set()
+        self.resumed = False
+        self._file = None
+        self._buffer = []
+        self._last_flush = 0
+
+    def open(self):
+        """读取相同迁移的日志并继续记录，返回是否为继续上次的迁移"""
+        loaded = self._load()
+        self.resumed = loaded is not None
+        if self.resumed:
+            self.done, self.steps = loaded
+        else:
+            self.done = {}
+            self.steps = set()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.header, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        return self.resumed
+
+    def _load(self):
+        """日志参数与本次迁移相同时返回 (已完成的文件, 已完成的步骤)，否则返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        try:
+            if not lines or json.loads(lines[0]) != self.header:
+                return None
+        except ValueError:
+            return None
+
+        done = {}
+        steps = set()
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 断电时最后一行可能不完整
+                continue
+            if isinstance(entry, dict):
+                if 'step' in entry:
+                    steps.add(entry['step'])
+            elif isinstance(entry, list) and len(entry) == 5:
+                done[entry[0]] = tuple(entry[1:])
+        return done, steps
+
+    def is_done(self, rel_path, path, source_file):
+        """rel_path 是否已完成，path 为该文件当前在磁盘上的位置，source_file 为本次要从中复制或链接的文件"""
+        info = self.done.get(rel_path)
+        if info is None:
+            return False
+        try:
+            st = os.stat(path)
+            src = os.stat(source_file)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns, src.st_size, src.st_mtime_ns) == info
+
+    def record(self, rel_path, path, source_file):
+        """记录已完成的文件，source_file 为复制或链接的来源文件"""
+        try:
+            st = os.stat(path)
+            src = os.stat(source_file)
+        except OSError:
+            return
+        info = (st.st_size, st.st_mtime_ns, src.st_size, src.st_mtime_ns)
+        self.done[rel_path] = info
+        self._buffer.append(json.dumps([rel_path, *info], ensure_ascii=False) + "\n")
+        if len(self._buffer) >= JOURNAL_FLUSH_ENTRIES or time.monotonic() - self._last_flush >= JOURNAL_FLUSH_INTERVAL:
+            self.flush()
+
+    def has_step(self, name):
+        return name in self.steps
+
+    def record_step(self, name):
+        """记录已完成的步骤并立即写入磁盘"""
+        self.steps.add(name)
+        self._buffer.append(json.dumps({'step': name}, ensure_ascii=False) + "\n")
+        self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """保留日志，下次执行相同的迁移时继续"""
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """迁移完成，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -4,6 +4,10 @@ import os
 import shutil
 from datetime import datetime
 
+from app_log import LogView, get_log_dir
+from role_catalog import RoleCatalog
+from ui_events import UIEventQueue
+
 
 class GameDataMigrator:
     def __init__(self, root):
@@ -116,14 +120,29 @@ class GameDataMigrator:
         self.game_paths = []  # 搜索到的游戏路径
         self.selected_path = tk.StringVar()
         self.game_version = tk.IntVar(value=1)  # 1:正式服, 2:测试服
-        self.user_roles = []  # 存储所有角色信息 (路径, 名称, 服务器等)
+        self.role_catalog = RoleCatalog()  # 所有角色 (路径, 账号, 名称, 服务器等)，按账号/路径索引
         self.source_role = tk.StringVar()
         self.target_role = tk.StringVar()
         self.backup_dirs = []  # 存储可用备份目录
+        self.backup_formats = {"完整复制": "copy", "增量快照": "incremental", "压缩归档": "archive",
+                               "打包": "pack", "备份库(去重)": "store"}  # 备份方式
+        self.search_cancel = None  # 当前搜索的取消标志
+        self.migration_cancel = None  # 当前迁移的取消标志
+        self.role_load_id = 0  # 角色加载编号
+        self.role_scan_cache = None  # 角色目录缓存
+        self.role_watcher = None  # userdata 目录监视
+        self.last_progress_log = 0  # 上次输出复制进度日志的时间
+
+        # 工作线程通过该队列更新界面，主循环定时合并处理
+        self.ui_events = UIEventQueue(self.root)
+        self.ui_events.start()
 
         # 创建主界面
         self.create_main_ui()
 
+        # 从缓存加载上次搜索到的游戏路径
+        self.load_cached_game_paths()
+
     def create_main_ui(self):
         """创建主界面"""
         # 创建标签页控件
@@ -188,6 +207,11 @@ class GameDataMigrator:
         self.search_btn = ttk.Button(search_frame, text="搜索游戏路径", command=self.search_game_paths)
         self.search_btn.pack(side=tk.LEFT, padx=5)
 
+        # 停止搜索按钮，找到需要的路径后可提前结束搜索
+        self.stop_search_btn = ttk.Button(search_frame, text="停止搜索", command=self.stop_search_game_paths,
+                                          state=tk.DISABLED)
+        self.stop_search_btn.pack(side=tk.LEFT, padx=5)
+
         # 搜索状态
         self.search_status = ttk.Label(search_frame, text="未搜索", foreground="gray")
         self.search_status.pack(side=tk.LEFT, padx=10)
@@ -245,16 +269,18 @@ class GameDataMigrator:
         role_list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
 
         # 角色列表
-        columns = ("index", "name", "server", "path")
+        columns = ("index", "name", "server", "size", "path")
         self.role_tree = ttk.Treeview(role_list_frame, columns=columns, show="headings", height=8)
         self.role_tree.heading("index", text="序号")
         self.role_tree.heading("name", text="角色名")
         self.role_tree.heading("server", text="服务器")
+        self.role_tree.heading("size", text="大小 (MB)")
         self.role_tree.heading("path", text="路径")
 
         self.role_tree.column("index", width=50, anchor=tk.CENTER)
         self.role_tree.column("name", width=100, anchor=tk.CENTER)
         self.role_tree.column("server", width=150, anchor=tk.CENTER)
+        self.role_tree.column("size", width=80, anchor=tk.E)
         self.role_tree.column("path", width=300, anchor=tk.W)
 
         # 添加滚动条
@@ -349,6 +375,22 @@ class GameDataMigrator:
         ttk.Label(target_info_frame, textvariable=self.target_path_var, foreground="red").grid(row=0, column=1,
                                                                                                sticky=tk.W, pady=2)
 
+        # 迁移方式
+        mode_frame = ttk.LabelFrame(self.migrate_tab, text="迁移方式", padding="10")
+        mode_frame.pack(fill=tk.X, pady=(0, 10))
+
+        self.migrate_mode = tk.StringVar(value="delta")
+        ttk.Radiobutton(mode_frame, text="增量同步", variable=self.migrate_mode, value="delta").pack(side=tk.LEFT,
+                                                                                                padx=10)
+        ttk.Radiobutton(mode_frame, text="合并 (保留目标独有文件)", variable=self.migrate_mode,
+                        value="merge").pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(mode_frame, text="完全覆盖", variable=self.migrate_mode, value="full").pack(side=tk.LEFT,
+                                                                                               padx=10)
+        self.verify_content = tk.BooleanVar(value=False)
+        ttk.Checkbutton(mode_frame, text="校验文件内容", variable=self.verify_content).pack(side=tk.LEFT, padx=10)
+        self.staged_migration = tk.BooleanVar(value=True)
+        ttk.Checkbutton(mode_frame, text="安全替换", variable=self.staged_migration).pack(side=tk.LEFT, padx=10)
+
         # 创建日志框架
         log_frame = ttk.LabelFrame(self.migrate_tab, text="操作日志", padding="10")
         log_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -362,6 +404,13 @@ class GameDataMigrator:
         log_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text.configure(yscroll=log_scroll.set)
 
+        # 完整日志写入日志文件，日志框只显示最近的记录
+        self.log_view = LogView(self.log_text)
+        log_btn_frame = ttk.Frame(self.migrate_tab)
+        log_btn_frame.pack(fill=tk.X, padx=10)
+        ttk.Label(log_btn_frame, text=f"完整日志保存在: {get_log_dir()}").pack(side=tk.LEFT)
+        ttk.Button(log_btn_frame, text="打开日志目录", command=self.open_log_dir).pack(side=tk.RIGHT)
+
         # 创建进度条
         self.progress_var = tk.DoubleVar(value=0)
         self.progress_bar = ttk.Progressbar(self.migrate_tab, variable=self.progress_var, length=100,
@@ -375,9 +424,17 @@ class GameDataMigrator:
         self.backup_btn = ttk.Button(btn_frame, text="手动备份目标角色", command=self.create_backup, state=tk.DISABLED)
         self.backup_btn.pack(side=tk.LEFT, padx=5)
 
+        # 备份方式
+        self.backup_format = tk.StringVar(value="完整复制")
+        ttk.Combobox(btn_frame, textvariable=self.backup_format, values=list(self.backup_formats), state="readonly",
+                     width=12).pack(side=tk.LEFT, padx=5)
+
         self.restore_btn = ttk.Button(btn_frame, text="恢复备份", command=self.restore_backup, state=tk.DISABLED)
         self.restore_btn.pack(side=tk.LEFT, padx=5)
 
+        self.prune_btn = ttk.Button(btn_frame, text="清理旧备份", command=self.prune_backups)
+        self.prune_btn.pack(side=tk.LEFT, padx=5)
+
         self.migrate_btn = ttk.Button(btn_frame, text="开始迁移", command=self.start_migration, state=tk.DISABLED)
         self.migrate_btn.pack(side=tk.RIGHT, padx=5)
 
@@ -395,35 +452,181 @@ class GameDataMigrator:
     def search_game_paths(self):
         """搜索游戏路径"""
         self.search_btn.config(state=tk.DISABLED)
+        self.stop_search_btn.config(state=tk.NORMAL)
         self.search_status.config(text="搜索中...", foreground="blue")
         self.status_var.set("正在搜索游戏路径...")
         self.root.update_idletasks()
 
         # 清空现有结果
+        self.game_paths = []
         for item in self.path_tree.get_children():
             self.path_tree.delete(item)
 
         # 在新线程中执行搜索，避免界面冻结
         import threading
-        search_thread = threading.Thread(target=self.do_search_game_paths)
+        self.search_cancel = threading.Event()
+        search_thread = threading.Thread(target=self.do_search_game_paths, args=(self.search_cancel,))
         search_thread.daemon = True
         search_thread.start()
 
-    def do_search_game_paths(self):
+    def do_search_game_paths(self, cancel_event):
         """实际执行游戏路径搜索的函数"""
         try:
-            # 调用路径搜索函数
+            # 调用路径搜索函数，每找到一个路径立即显示
+            from app_config import load_config
             from find_paths import find_target_directories
-            self.game_paths = find_target_directories(r'SeasunGame\Game')
+            from prune_rules import PruneRules
+            config = load_config()
+            rules = PruneRules.from_config(config)
+            # 文件夹大小在找到路径后另行异步计算，不拖慢搜索
+            find_target_directories(
+                os.path.join('SeasunGame', 'Game'),
+                rules=rules,
+                on_found=lambda result: self.ui_events.post(lambda: self.add_path_result(result)),
+                cancel_event=cancel_event,
+                time_budget=config.get('search', {}).get('time_budget'),
+                with_size=False
+            )
+            prune_summary = rules.format_stats()
+            self.ui_events.post(lambda: self.log_message(f"搜索剪枝统计: {prune_summary}"))
 
             # 在主线程中更新UI
-            self.root.after(0, self.update_path_list)
+            self.ui_events.post(lambda: self.finish_search_game_paths(cancel_event.is_set()))
+
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"搜索失败: {str(e)}"))
+            self.ui_events.post(lambda: self.finish_search_game_paths(True))
+
+    def add_path_result(self, result):
+        """搜索过程中添加一个找到的路径"""
+        path, size, error = result
+        if self.path_tree.exists(path):
+            return
+        self.game_paths.append(result)
+        self.path_tree.insert("", tk.END, iid=path, values=(len(self.game_paths), path, self.format_size(size)))
+        if error:
+            self.status_var.set(f"警告: {error}")
+        if size is None:
+            self.request_path_size(path)
+
+        # 找到第一个路径后即可确认，无需等待搜索结束
+        self.confirm_btn.config(state=tk.NORMAL)
+        if str(self.search_btn['state']) == tk.DISABLED:
+            self.search_status.config(text=f"已找到 {len(self.game_paths)} 个路径, 继续搜索中...",
+                                      foreground="blue")
+
+    def stop_search_game_paths(self):
+        """停止正在进行的搜索"""
+        if self.search_cancel is not None:
+            self.search_cancel.set()
+        self.stop_search_btn.config(state=tk.DISABLED)
+        self.status_var.set("正在停止搜索...")
+
+    def finish_search_game_paths(self, stopped):
+        """搜索结束"""
+        self.stop_search_btn.config(state=tk.DISABLED)
+
+        # 保存搜索结果，下次启动直接使用；提前停止且没有结果时保留原缓存
+        if self.game_paths or not stopped:
+            self.save_game_path_cache()
+
+        if not self.game_paths:
+            self.update_path_list()
+            return
+
+        suffix = " (已提前停止)" if stopped else ""
+        self.search_status.config(text=f"找到 {len(self.game_paths)} 个路径{suffix}", foreground="green")
+        self.status_var.set(f"搜索完成: 找到 {len(self.game_paths)} 个游戏路径{suffix}")
+        self.search_btn.config(state=tk.NORMAL)
+
+    def format_size(self, size):
+        """格式化大小列，None 表示仍在计算"""
+        if size is None:
+            return "计算中..."
+        return f"{size} MB" if size > 0 else "未知"
+
+    def request_path_size(self, path):
+        """在后台计算游戏路径大小，完成后更新列表"""
+        from folder_size import get_folder_sizer
+        get_folder_sizer().submit(
+            path,
+            lambda p, size, error: self.ui_events.post(lambda: self.update_path_size(p, size, error))
+        )
 
+    def update_path_size(self, path, size, error):
+        """游戏路径大小计算完成"""
+        for i, (game_path, _, _) in enumerate(self.game_paths):
+            if game_path == path:
+                self.game_paths[i] = (path, size, error)
+                break
+        else:
+            return
+
+        if self.path_tree.exists(path):
+            self.path_tree.set(path, "size", self.format_size(size))
+        if error:
+            self.status_var.set(f"警告: {error}")
+
+        # 搜索结束后才更新缓存，搜索中的结果在搜索结束时统一保存
+        if str(self.search_btn['state']) != tk.DISABLED:
+            self.save_game_path_cache()
+
+    def save_game_path_cache(self):
+        """保存当前的游戏路径列表到缓存"""
+        from path_cache import make_cache_entries, save_path_cache
+        save_path_cache(make_cache_entries(self.game_paths))
+
+    def load_cached_game_paths(self):
+        """启动时从缓存加载游戏路径，并在后台校验缓存"""
+        from path_cache import load_path_cache, cache_to_game_paths
+        entries = load_path_cache()
+        if not entries:
+            return
+
+        self.game_paths = cache_to_game_paths(entries)
+        self.update_path_list()
+        self.search_status.config(text=f"已从缓存加载 {len(self.game_paths)} 个路径 (校验中...)", foreground="blue")
+        self.status_var.set(f"已从缓存加载 {len(self.game_paths)} 个游戏路径")
+
+        import threading
+        check_thread = threading.Thread(target=self.do_revalidate_path_cache, args=(entries,))
+        check_thread.daemon = True
+        check_thread.start()
+
+    def do_revalidate_path_cache(self, entries):
+        """后台校验缓存的游戏路径"""
+        from path_cache import revalidate_path_cache, save_path_cache
+        try:
+            valid, missing = revalidate_path_cache(entries)
+            save_path_cache(valid)
+            changed = valid != entries
+            self.ui_events.post(lambda: self.on_path_cache_revalidated(valid, missing, changed))
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"搜索失败: {str(e)}"))
+            self.ui_events.post(lambda: self.log_message(f"校验路径缓存失败: {str(e)}"))
+
+    def on_path_cache_revalidated(self, entries, missing, changed):
+        """缓存校验完成"""
+        # 用户已手动发起搜索时，以搜索结果为准
+        if str(self.search_btn['state']) == tk.DISABLED:
+            return
+
+        if missing:
+            # 有缓存路径已失效，重新执行完整搜索
+            self.log_message("缓存的游戏路径已失效，重新搜索游戏路径")
+            self.search_game_paths()
+            return
+
+        if changed:
+            from path_cache import cache_to_game_paths
+            self.game_paths = cache_to_game_paths(entries)
+            self.update_path_list()
+        self.search_status.config(text=f"已从缓存加载 {len(self.game_paths)} 个路径", foreground="green")
 
     def update_path_list(self):
         """更新路径列表显示"""
+        for item in self.path_tree.get_children():
+            self.path_tree.delete(item)
+
         if not self.game_paths:
             self.search_status.config(text="未找到游戏路径", foreground="red")
             self.status_var.set("搜索完成: 未找到游戏路径")
@@ -432,12 +635,13 @@ class GameDataMigrator:
 
         # 添加搜索结果到列表
         for i, (path, size, error) in enumerate(self.game_paths, 1):
-            size_str = f"{size} MB" if size > 0 else "未知"
-            self.path_tree.insert("", tk.END, values=(i, path, size_str))
+            self.path_tree.insert("", tk.END, iid=path, values=(i, path, self.format_size(size)))
 
             # 如果有错误信息，显示在状态栏
             if error:
                 self.status_var.set(f"警告: {error}")
+            if size is None:
+                self.request_path_size(path)
 
         self.search_status.config(text=f"找到 {len(self.game_paths)} 个路径", foreground="green")
         self.status_var.set(f"搜索完成: 找到 {len(self.game_paths)} 个游戏路径")
@@ -465,13 +669,17 @@ class GameDataMigrator:
         version = self.version_var.get()
         version_dir = "JX3" if version == 1 else "JX3_EXP"
         self.game_path = os.path.join(self.selected_path.get(), version_dir)
-        self.userdata_path = os.path.join(self.game_path, r'bin\zhcn_hd\userdata')
+        self.userdata_path = os.path.join(self.game_path, 'bin', 'zhcn_hd', 'userdata')
 
         # 验证路径是否存在
         if not os.path.exists(self.userdata_path):
             messagebox.showerror("错误", f"用户数据路径不存在:\n{self.userdata_path}")
             return
 
+        # 已选定路径，停止仍在进行的搜索
+        if self.search_cancel is not None:
+            self.search_cancel.set()
+
         # 加载用户角色
         self.load_user_roles()
 
@@ -485,98 +693,86 @@ class GameDataMigrator:
         self.root.update_idletasks()
 
         # 清空现有角色数据
-        self.user_roles = []
+        self.role_catalog.clear()
         for item in self.role_tree.get_children():
             self.role_tree.delete(item)
 
+        # 每次加载使用新的编号，忽略上一次未完成加载的结果
+        self.role_load_id += 1
+
         # 在新线程中执行角色加载
         import threading
-        load_thread = threading.Thread(target=self.do_load_user_roles)
+        load_thread = threading.Thread(target=self.do_load_user_roles, args=(self.role_load_id,))
         load_thread.daemon = True
         load_thread.start()
 
-    def do_load_user_roles(self):
+    def do_load_user_roles(self, load_id):
         """实际执行角色加载的函数"""
         try:
-            # 筛选出有数据的角色
-            valid_users = []
-
-            # 检查userdata目录下的用户文件夹
-            for user in os.listdir(self.userdata_path):
-                user_path = os.path.join(self.userdata_path, user)
-                if os.path.isdir(user_path) and len(user) >= 4 and '.dat' not in user:
-                    # 检查是否包含大区目录
-                    has_region = False
-                    for entry in os.listdir(user_path):
-                        entry_path = os.path.join(user_path, entry)
-                        if os.path.isdir(entry_path) and entry in ['电信区', '双线区', '无界区']:
-                            has_region = True
-                            break
-
-                    if has_region:
-                        valid_users.append(user)
-
-            # 遍历用户_大区_服务器_角色
-            count_seq = self.userdata_path.count(os.sep)
-            user_roles = []
-            self.account_roles = {}
-
-            for user in valid_users:
-                user_path = os.path.join(self.userdata_path, user)
-                # 初始化账号角色列表
-                self.account_roles[user] = []
-
-                # 遍历用户目录下的所有子目录
-                for dirpath, _, _ in os.walk(user_path):
-                    # 计算当前路径深度
-                    current_depth = dirpath.count(os.sep) - count_seq
-
-                    # 角色路径深度为4级 (user/大区/服务器/角色)
-                    if current_depth == 4:
-                        # 提取角色信息
-                        path_parts = dirpath.split(os.sep)
-                        role_name = path_parts[-1]
-                        server = path_parts[-2]
-                        region = path_parts[-3]
-
-                        # 排除名称包含'手动备份'的角色
-                        if '手动备份' not in role_name:
-                            role_info = {
-                                'path': dirpath,
-                                'name': role_name,
-                                'server': f"{region} - {server}",
-                                'index': len(user_roles) + 1
-                            }
-                            user_roles.append(role_info)
-                            # 添加到账号角色映射
-                            self.account_roles[user].append(role_info)
-
-            self.user_roles = user_roles
-            self.root.after(0, self.update_role_list)
+            from role_scan import RoleScanCache, iter_account_roles
+
+            # 角色目录缓存按各级目录的修改时间增量刷新，同一游戏路径复用内存中的缓存
+            cache = self.role_scan_cache
+            if cache is None or cache.userdata_path != self.userdata_path:
+                cache = RoleScanCache(self.userdata_path)
+                self.role_scan_cache = cache
+            cache.rescanned = 0
+
+            # 各账号并行扫描，每扫描完一个账号就把角色交给界面显示
+            for account, roles in iter_account_roles(self.userdata_path, cache=cache):
+                self.ui_events.post(lambda a=account, r=roles: self.add_role_batch(load_id, a, r))
+            cache.save()
+
+            rescanned = cache.rescanned
+            self.ui_events.post(lambda: self.log_message(f"角色列表已刷新，重新扫描 {rescanned} 个目录"))
+            self.ui_events.post(lambda: self.update_role_list(load_id))
 
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"加载角色失败: {str(e)}"))
+            self.ui_events.post(lambda: self.show_error(f"加载角色失败: {str(e)}"))
 
-    def update_role_list(self):
-        """更新角色列表显示"""
-        if not self.user_roles:
+    def add_role_batch(self, load_id, account, roles):
+        """添加一个账号的角色到列表"""
+        if load_id != self.role_load_id:
+            return
+
+        # 添加到角色目录
+        self.role_catalog.add_account(account)
+        for role in roles:
+            if self.role_catalog.add(role):
+                self.insert_role_row(role)
+
+        # 角色数据大小在后台计算，逐个填入
+        from folder_size import get_folder_sizer
+        sizer = get_folder_sizer()
+        for role in roles:
+            sizer.submit(
+                role.path,
+                lambda p, size, error: self.ui_events.post(lambda: self.update_role_size(p, size))
+            )
+        self.status_var.set(f"正在加载角色数据... 已加载 {len(self.role_catalog)} 个角色")
+
+    def insert_role_row(self, role):
+        """在角色列表中插入一行"""
+        self.role_tree.insert("", tk.END, iid=role.path, values=(
+            role.index,
+            role.name,
+            role.server,
+            self.format_size(None),
+            role.path
+        ))
+
+    def update_role_list(self, load_id=None):
+        """角色加载完成，更新账号和角色下拉框"""
+        if load_id is not None and load_id != self.role_load_id:
+            return
+
+        if not self.role_catalog:
             messagebox.showwarning("警告", "未找到任何游戏角色数据")
             self.status_var.set("就绪: 未找到角色数据")
             return
 
-        # 添加角色到列表
-        role_names = []
-        for role in self.user_roles:
-            self.role_tree.insert("", tk.END, values=(
-                role['index'],
-                role['name'],
-                role['server'],
-                role['path']
-            ))
-            role_names.append(f"{role['name']} ({role['server']})")
-
         # 更新账号下拉框
-        account_names = list(self.account_roles.keys())
+        account_names = self.role_catalog.accounts()
         self.source_account_combobox['values'] = account_names
         self.target_account_combobox['values'] = account_names
 
@@ -593,14 +789,98 @@ class GameDataMigrator:
             self.backup_btn.config(state=tk.NORMAL)
             self.migrate_btn.config(state=tk.NORMAL)
 
-        self.status_var.set(f"已加载 {len(self.user_roles)} 个角色数据")
+        self.status_var.set(f"已加载 {len(self.role_catalog)} 个角色数据")
+
+        # 开始监视角色目录变化，无需手动刷新
+        self.start_role_watcher()
+
+    def start_role_watcher(self):
+        """监视当前 userdata 目录"""
+        from role_watcher import RoleWatcher
+        if self.role_watcher is not None:
+            if self.role_watcher.userdata_path == self.userdata_path:
+                return
+            self.role_watcher.stop()
+
+        # 事件带上产生它的监视器，换了 userdata 目录后旧监视器已排队的事件不再应用
+        watcher = RoleWatcher(
+            self.userdata_path,
+            lambda events: self.ui_events.post(lambda: self.apply_role_events(events, watcher))
+        )
+        self.role_watcher = watcher
+        watcher.start()
+
+    def apply_role_events(self, events, watcher):
+        """应用目录监视得到的角色增删事件；watcher 不是当前 userdata 目录的监视器时丢弃"""
+        if (watcher is not self.role_watcher or watcher.userdata_path != self.userdata_path
+                or not self.role_tree.winfo_exists()):
+            return
+
+        from folder_size import get_folder_sizer
+        sizer = get_folder_sizer()
+        added = removed = 0
+        for event_type, role in events:
+            path = role.path
+            if event_type == 'add':
+                if not self.role_catalog.add(role):
+                    continue
+                self.insert_role_row(role)
+                added += 1
+            elif event_type == 'remove':
+                self.role_catalog.remove(path)
+                if self.role_tree.exists(path):
+                    self.role_tree.delete(path)
+                removed += 1
+                continue
+
+            # 新增或内容可能变化的角色重新计算大小
+            sizer.submit(path, lambda p, size, error: self.ui_events.post(lambda: self.update_role_size(p, size)))
+
+        if not added and not removed:
+            return
+
+        # 重新编号并刷新下拉框，保留当前选择
+        self.role_catalog.renumber()
+        for role in self.role_catalog:
+            if self.role_tree.exists(role.path):
+                self.role_tree.set(role.path, "index", role.index)
+        self.refresh_role_comboboxes()
+        self.log_message(f"检测到角色变化: 新增 {added} 个, 移除 {removed} 个")
+        self.status_var.set(f"已加载 {len(self.role_catalog)} 个角色数据")
+
+    def refresh_role_comboboxes(self):
+        """角色列表变化后刷新下拉框，尽量保留当前选择"""
+        account_names = self.role_catalog.accounts()
+        for account_combobox, role_combobox in ((self.source_account_combobox, self.source_combobox),
+                                                (self.target_account_combobox, self.target_combobox)):
+            selected_account = account_combobox.get()
+            selected_role = role_combobox.get()
+            account_combobox['values'] = account_names
+            if not self.role_catalog.has_account(selected_account):
+                if not account_names:
+                    continue
+                account_combobox.current(0)
+                selected_account = account_names[0]
+
+            role_values = self.role_catalog.labels(selected_account)
+            role_combobox['values'] = role_values
+            if selected_role in role_values:
+                role_combobox.current(role_values.index(selected_role))
+            elif role_values:
+                role_combobox.current(0)
+            else:
+                role_combobox.set("")
+
+    def update_role_size(self, path, size):
+        """角色数据大小计算完成"""
+        if self.role_tree.exists(path):
+            self.role_tree.set(path, "size", self.format_size(size))
 
     def on_source_account_select(self, event):
         """源账号选择事件处理"""
         selected_account = self.source_account_combobox.get()
-        if selected_account in self.account_roles:
-            roles = self.account_roles[selected_account]
-            role_values = [f"{role['server']} - {role['name']}" for role in roles]
+        if self.role_catalog.has_account(selected_account):
+            role_values = self.role_catalog.labels(selected_account)
             self.source_combobox['values'] = role_values
             if role_values:
                 self.source_combobox.current(0)
@@ -608,9 +888,8 @@ class GameDataMigrator:
     def on_target_account_select(self, event):
         """目标账号选择事件处理"""
         selected_account = self.target_account_combobox.get()
-        if selected_account in self.account_roles:
-            roles = self.account_roles[selected_account]
-            role_values = [f"{role['server']} - {role['name']}" for role in roles]
+        if self.role_catalog.has_account(selected_account):
+            role_values = self.role_catalog.labels(selected_account)
             self.target_combobox['values'] = role_values
             if role_values:
                 self.target_combobox.current(0)
@@ -660,37 +939,19 @@ class GameDataMigrator:
 
     def show_text_tree(self):
         """显示纯文本树状结构"""
-        if not hasattr(self, 'user_roles') or not self.user_roles:
+        if not self.role_catalog:
             messagebox.showinfo("提示", "请先在路径选择标签页选择有效的游戏路径并加载角色数据")
             return
 
         # 构建角色关系数据
         role_hierarchy = {}
-        
-        # 确保路径结构符合 userdata/账号/大区/区服/角色名
-        for role in self.user_roles:
-            path_parts = role['path'].split(os.sep)
-            
-            # 查找 'userdata' 目录的位置
-            userdata_index = -1
-            for i, part in enumerate(path_parts):
-                if part.lower() == 'userdata':
-                    userdata_index = i
-                    break
-            
-            if userdata_index == -1:
-                # 如果路径中没有 'userdata' 目录，使用原逻辑
-                count_seq = self.userdata_path.count(os.sep)
-                user = path_parts[count_seq]
-                region = path_parts[count_seq + 1]
-                server = path_parts[count_seq + 2]
-                role_name = path_parts[count_seq + 3]
-            else:
-                # 按照 userdata/账号/大区/区服/角色名 结构提取
-                user = path_parts[userdata_index + 1] if len(path_parts) > userdata_index + 1 else '未知账号'
-                region = path_parts[userdata_index + 2] if len(path_parts) > userdata_index + 2 else '未知大区'
-                server = path_parts[userdata_index + 3] if len(path_parts) > userdata_index + 3 else '未知区服'
-                role_name = path_parts[userdata_index + 4] if len(path_parts) > userdata_index + 4 else '未知角色'
+
+        # 角色记录中已包含 账号/大区/区服/角色名
+        for role in self.role_catalog:
+            user = role.account
+            region = role.region
+            server = role.server_name
+            role_name = role.name
 
             # 构建层级结构
             if user not in role_hierarchy:
@@ -889,7 +1150,7 @@ class GameDataMigrator:
             canvas.xview_moveto((center_x / canvas.winfo_width()) * (1 - scale_factor) + canvas.xview()[0])
             canvas.yview_moveto((center_y / canvas.winfo_height()) * (1 - scale_factor) + canvas.yview()[0])
 
-        self.status_var.set(f"已加载 {len(self.user_roles)} 个角色数据")
+        self.status_var.set(f"已加载 {len(self.role_catalog)} 个角色数据")
 
 
 
@@ -904,22 +1165,18 @@ class GameDataMigrator:
         target_role_text = self.target_combobox.get()
 
         # 查找源角色信息
-        if source_account in self.account_roles and source_role_text:
-            for role in self.account_roles[source_account]:
-                if f"{role['server']} - {role['name']}" == source_role_text:
-                    self.source_path_var.set(role['path'])
-                    break
+        source_role = self.role_catalog.find(source_account, source_role_text)
+        if source_role is not None:
+            self.source_path_var.set(source_role.path)
 
         # 查找目标角色信息
-        if target_account in self.account_roles and target_role_text:
-            for role in self.account_roles[target_account]:
-                if f"{role['server']} - {role['name']}" == target_role_text:
-                    self.target_path_var.set(role['path'])
-                    break
+        target_role = self.role_catalog.find(target_account, target_role_text)
+        if target_role is not None:
+            self.target_path_var.set(target_role.path)
 
         # 启用/禁用按钮
-        source_valid = source_account in self.account_roles and source_role_text
-        target_valid = target_account in self.account_roles and target_role_text
+        source_valid = source_role is not None
+        target_valid = target_role is not None
         different_roles = source_role_text != target_role_text or source_account != target_account
 
         if source_valid and target_valid and different_roles:
@@ -929,33 +1186,65 @@ class GameDataMigrator:
         else:
             self.migrate_btn.config(state=tk.DISABLED)
 
+    def get_selected_target_role(self):
+        """获取当前选择的目标角色"""
+        return self.role_catalog.find(self.target_account_combobox.get(), self.target_combobox.get())
+
     def create_backup(self):
         """创建目标角色备份"""
-        target_idx = self.target_combobox.current()
-        if target_idx < 0 or target_idx >= len(self.user_roles):
+        target_role = self.get_selected_target_role()
+        if target_role is None:
             messagebox.showwarning("警告", "请先选择有效的目标角色")
             return
 
-        target_role = self.user_roles[target_idx]
-        target_path = target_role['path']
+        target_path = target_role.path
+        backup_format = self.backup_formats.get(self.backup_format.get(), "copy")
 
         # 生成备份路径
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = f"{target_role['name']}_手动备份_{timestamp}"
+        backup_dir = f"{target_role.name}_手动备份_{timestamp}"
         backup_path = os.path.join(os.path.dirname(target_path), backup_dir)
 
         try:
             # 创建备份
-            self.log_message(f"开始创建手动备份: {backup_path}")
+            if backup_format == "store":
+                self.log_message(f"开始备份到备份库: {target_path}")
+            elif backup_format == "archive":
+                self.log_message(f"开始创建压缩归档: {backup_path}.zip")
+            elif backup_format == "pack":
+                self.log_message(f"开始创建打包备份: {backup_path}.pack")
+            else:
+                self.log_message(f"开始创建手动备份: {backup_path}")
             self.status_var.set("正在创建手动备份...")
             self.backup_btn.config(state=tk.DISABLED)
 
             # 使用线程执行备份，避免界面冻结
             import threading
-            backup_thread = threading.Thread(
-                target=self.do_create_backup,
-                args=(target_path, backup_path)
-            )
+            if backup_format == "store":
+                backup_thread = threading.Thread(
+                    target=self.do_create_store_backup,
+                    args=(target_path, target_role.name)
+                )
+            elif backup_format == "archive":
+                backup_thread = threading.Thread(
+                    target=self.do_create_archive_backup,
+                    args=(target_path, backup_path, target_role.name)
+                )
+            elif backup_format == "pack":
+                backup_thread = threading.Thread(
+                    target=self.do_create_pack_backup,
+                    args=(target_path, backup_path, target_role.name)
+                )
+            elif backup_format == "incremental":
+                backup_thread = threading.Thread(
+                    target=self.do_create_incremental_backup,
+                    args=(target_path, backup_path, target_role.name, self.verify_content.get())
+                )
+            else:
+                backup_thread = threading.Thread(
+                    target=self.do_create_backup,
+                    args=(target_path, backup_path, target_role.name)
+                )
             backup_thread.daemon = True
             backup_thread.start()
 
@@ -963,59 +1252,246 @@ class GameDataMigrator:
             self.show_error(f"创建备份失败: {str(e)}")
             self.backup_btn.config(state=tk.NORMAL)
 
-    def do_create_backup(self, source, dest):
+    def do_create_backup(self, source, dest, role_name):
         """实际执行备份操作"""
         try:
             # 确保目标目录不存在
             if os.path.exists(dest):
                 shutil.rmtree(dest)
 
-            # 复制目录
-            shutil.copytree(source, dest)
+            # 由线程池并行复制角色目录
+            from copy_executor import CopyExecutor
+            from sync_engine import scan_tree
+            dirs, files = scan_tree(source)
+            make_dirs = sorted(dirs, key=lambda p: (p.count(os.sep), p))
+            errors = CopyExecutor().run(source, dest, make_dirs,
+                                        sorted((rel, info[0]) for rel, info in files.items()))
+            if errors:
+                self.report_copy_errors("备份", errors)
+                self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+                return
+
+            # 记录角色与备份的文件清单；copy2 保留修改时间，备份直接沿用角色清单中的哈希
+            from manifest import refresh_manifest
+            source_manifest = refresh_manifest(source)
+            refresh_manifest(dest, reuse=[source_manifest])
+
+            # 记录备份路径
+            self.backup_dirs.append(dest)
+            self.record_backup(source, role_name, "copy", dest, source_manifest)
+
+            self.ui_events.post(lambda: self.log_message(f"手动备份创建成功: {dest}"))
+            self.ui_events.post(lambda: messagebox.showinfo("成功", f"手动备份创建成功:\n{dest}"))
+            self.ui_events.post(lambda: self.status_var.set("手动备份创建成功"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"备份失败: {str(e)}"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+    def record_backup(self, role_path, role_name, backup_format, location, manifest):
+        """把新建的备份记入备份目录，manifest 为备份内容的文件清单"""
+        from backup_catalog import BackupCatalog
+        from manifest import manifest_digest
+        total_bytes = sum(info[0] for info in manifest.values())
+        BackupCatalog().add(role_path, role_name, backup_format, location, total_bytes, len(manifest),
+                            manifest_digest(manifest))
+
+        # 配置了自动清理时，在当前备份线程中按保留策略删除旧备份；
+        # 所有保留规则都被关闭时不自动清理，避免不经确认删除除最新以外的全部备份
+        from backup_retention import RetentionPolicy
+        policy = RetentionPolicy.from_config()
+        if policy.auto:
+            if policy.has_keep_rules:
+                self.do_prune_backups(policy, confirm=False)
+            else:
+                self.ui_events.post(lambda: self.log_message("保留策略未设置任何保留规则，已跳过自动清理"))
+
+    def prune_backups(self):
+        """按保留策略清理旧备份：先在后台计算需删除的备份和可释放的空间，确认后删除"""
+        from backup_retention import RetentionPolicy
+        policy = RetentionPolicy.from_config()
+        self.prune_btn.config(state=tk.DISABLED)
+        self.status_var.set("正在计算备份占用空间...")
+
+        import threading
+        prune_thread = threading.Thread(target=self.do_prune_backups, args=(policy,))
+        prune_thread.daemon = True
+        prune_thread.start()
+
+    def do_prune_backups(self, policy, confirm=True):
+        """计算并执行备份清理，在工作线程中调用；confirm 为 True 时删除前在界面中确认"""
+        from backup_catalog import BackupCatalog
+        from backup_retention import account_of_role, apply_retention, plan_retention
+        try:
+            catalog = BackupCatalog()
+            records = [record for record in catalog.list_all() if os.path.exists(record.location)]
+            remove, before, after = plan_retention(records, policy, account_of_role)
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"计算备份占用空间失败: {str(e)}"))
+            self.ui_events.post(lambda: self.prune_btn.config(state=tk.NORMAL))
+            return
+
+        before_mb = round(before / (1024 * 1024), 2)
+        after_mb = round(after / (1024 * 1024), 2)
+        if not remove:
+            if confirm:
+                self.ui_events.post(lambda: messagebox.showinfo(
+                    "提示", f"没有需要清理的备份\n{len(records)} 个备份共占用 {before_mb} MB"))
+                self.ui_events.post(lambda: self.status_var.set("没有需要清理的备份"))
+            self.ui_events.post(lambda: self.prune_btn.config(state=tk.NORMAL))
+            return
+
+        def delete():
+            errors = apply_retention(remove, catalog)
+            self.ui_events.post(lambda: self.on_backups_pruned(len(remove) - len(errors), before_mb, after_mb, errors))
+
+        if not confirm:
+            delete()
+            return
+
+        def ask():
+            names = "\n".join(os.path.basename(record.location) for record in remove[:10])
+            if len(remove) > 10:
+                names += f"\n... 另有 {len(remove) - 10} 个"
+            if not messagebox.askyesno(
+                    "确认清理",
+                    f"将删除 {len(remove)} 个旧备份，备份占用空间从 {before_mb} MB 减少到 {after_mb} MB:\n\n{names}"):
+                self.status_var.set("已取消清理")
+                self.prune_btn.config(state=tk.NORMAL)
+                return
+            self.status_var.set("正在清理旧备份...")
+            import threading
+            delete_thread = threading.Thread(target=delete)
+            delete_thread.daemon = True
+            delete_thread.start()
+
+        self.ui_events.post(ask)
+
+    def on_backups_pruned(self, removed, before_mb, after_mb, errors):
+        self.log_message(f"已清理 {removed} 个旧备份，备份占用空间 {before_mb} MB -> {after_mb} MB")
+        for location, error in errors:
+            self.log_message(f"删除备份失败: {location}: {error}")
+        self.status_var.set("旧备份清理完成")
+        self.prune_btn.config(state=tk.NORMAL)
+
+    def do_create_incremental_backup(self, source, dest, role_name, verify_hash):
+        """创建增量快照：与上一个手动备份相同的文件以硬链接共享，只复制变化的文件"""
+        try:
+            from incremental_backup import create_incremental_backup, find_latest_backup
+            previous = find_latest_backup(source, role_name)
+            if previous:
+                self.ui_events.post(lambda: self.log_message(f"以上一个备份为基础: {previous}"))
+
+            linked, copied, copied_bytes, errors = create_incremental_backup(source, dest, previous, verify_hash)
+            if errors:
+                self.report_copy_errors("备份", errors)
+                self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+                return
+
+            # 记录备份路径
+            from manifest import load_manifest
+            self.backup_dirs.append(dest)
+            self.record_backup(source, role_name, "incremental", dest, load_manifest(dest))
+
+            copied_mb = round(copied_bytes / (1024 * 1024), 2)
+            self.ui_events.post(lambda: self.log_message(
+                f"增量快照创建成功: {dest}\n链接 {linked} 个未变化的文件，复制 {copied} 个文件 ({copied_mb} MB)"))
+            self.ui_events.post(lambda: messagebox.showinfo("成功", f"增量快照创建成功:\n{dest}"))
+            self.ui_events.post(lambda: self.status_var.set("手动备份创建成功"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"备份失败: {str(e)}"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+    def do_create_archive_backup(self, source, backup_path, role_name):
+        """创建压缩归档备份，压缩方式可在 config.json 的 backup.archive_codec 中设置(deflate 或 lzma)"""
+        try:
+            from app_config import load_config
+            from archive_backup import ARCHIVE_SUFFIX, CODEC_DEFLATE, CODEC_LZMA, create_archive
+            codec = load_config().get('backup', {}).get('archive_codec', CODEC_DEFLATE)
+            if codec not in (CODEC_DEFLATE, CODEC_LZMA):
+                codec = CODEC_DEFLATE
+            dest = backup_path + ARCHIVE_SUFFIX
+
+            count, total_bytes, archive_bytes = create_archive(source, dest, codec)
+
+            # 记录备份路径
+            from manifest import refresh_manifest
+            self.backup_dirs.append(dest)
+            self.record_backup(source, role_name, "archive", dest, refresh_manifest(source))
+
+            total_mb = round(total_bytes / (1024 * 1024), 2)
+            archive_mb = round(archive_bytes / (1024 * 1024), 2)
+            self.ui_events.post(lambda: self.log_message(
+                f"压缩归档创建成功: {dest}\n{count} 个文件，{total_mb} MB 压缩为 {archive_mb} MB"))
+            self.ui_events.post(lambda: messagebox.showinfo("成功", f"压缩归档创建成功:\n{dest}"))
+            self.ui_events.post(lambda: self.status_var.set("手动备份创建成功"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"备份失败: {str(e)}"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+    def do_create_pack_backup(self, source, backup_path, role_name):
+        """创建打包备份：所有文件写入一个数据文件，减少逐个文件的创建开销"""
+        try:
+            from pack_backup import PACK_SUFFIX, create_pack
+            dest = backup_path + PACK_SUFFIX
+            count, total_bytes = create_pack(source, dest)
 
             # 记录备份路径
+            from manifest import refresh_manifest
             self.backup_dirs.append(dest)
+            self.record_backup(source, role_name, "pack", dest, refresh_manifest(source))
 
-            self.root.after(0, lambda: self.log_message(f"手动备份创建成功: {dest}"))
-            self.root.after(0, lambda: messagebox.showinfo("成功", f"手动备份创建成功:\n{dest}"))
-            self.root.after(0, lambda: self.status_var.set("手动备份创建成功"))
-            self.root.after(0, lambda: self.backup_btn.config(state=tk.NORMAL))
+            total_mb = round(total_bytes / (1024 * 1024), 2)
+            self.ui_events.post(lambda: self.log_message(f"打包备份创建成功: {dest}\n{count} 个文件 ({total_mb} MB)"))
+            self.ui_events.post(lambda: messagebox.showinfo("成功", f"打包备份创建成功:\n{dest}"))
+            self.ui_events.post(lambda: self.status_var.set("手动备份创建成功"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
 
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"备份失败: {str(e)}"))
-            self.root.after(0, lambda: self.backup_btn.config(state=tk.NORMAL))
+            self.ui_events.post(lambda: self.show_error(f"备份失败: {str(e)}"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+    def do_create_store_backup(self, source, role_name):
+        """备份到备份库，未变化的文件不重复保存"""
+        try:
+            from backup_store import BackupStore
+            snapshot, new_bytes = BackupStore().create_snapshot(source, role_name)
+            self.record_backup(source, role_name, "store", snapshot.path, snapshot.files)
+            total_mb = round(snapshot.total_bytes / (1024 * 1024), 2)
+            new_mb = round(new_bytes / (1024 * 1024), 2)
+
+            self.ui_events.post(lambda: self.log_message(
+                f"备份库备份创建成功: {len(snapshot.files)} 个文件 ({total_mb} MB)，新保存 {new_mb} MB"))
+            self.ui_events.post(lambda: messagebox.showinfo(
+                "成功", f"备份库备份创建成功\n共 {total_mb} MB，其中新保存 {new_mb} MB"))
+            self.ui_events.post(lambda: self.status_var.set("手动备份创建成功"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
+
+        except Exception as e:
+            self.ui_events.post(lambda: self.show_error(f"备份失败: {str(e)}"))
+            self.ui_events.post(lambda: self.backup_btn.config(state=tk.NORMAL))
 
     def restore_backup(self):
         """恢复备份"""
         # 查找所有备份
-        target_idx = self.target_combobox.current()
-        if target_idx < 0 or target_idx >= len(self.user_roles):
+        target_role = self.get_selected_target_role()
+        if target_role is None:
             messagebox.showwarning("警告", "请先选择有效的目标角色")
             return
 
-        target_role = self.user_roles[target_idx]
-        target_path = target_role['path']
-        backup_parent = os.path.dirname(target_path)
-
-        # 查找所有备份目录
-        backups = []
-        for entry in os.listdir(backup_parent):
-            entry_path = os.path.join(backup_parent, entry)
-            if os.path.isdir(entry_path) and (entry.startswith(f"{target_role['name']}_手动备份_") or entry.startswith(
-                    f"{target_role['name']}_备份_")):
-                # 提取时间戳
-                try:
-                    if "_手动备份_" in entry:
-                        timestamp_str = entry.split("_手动备份_")[1]
-                    else:
-                        timestamp_str = entry.split("_备份_")[1]
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-                    backups.append((timestamp, entry, entry_path))
-                except:
-                    continue
+        target_path = target_role.path
 
-        # 按时间戳排序，最新的在前
-        backups.sort(reverse=True, key=lambda x: x[0])
+        # 从备份目录中读取备份记录；首次打开时导入此前创建的目录备份
+        from backup_catalog import FORMAT_ARCHIVE, FORMAT_NAMES, FORMAT_PACK, BackupCatalog
+        catalog = BackupCatalog()
+        if not catalog.is_imported(target_path):
+            catalog.import_existing(target_path, target_role.name)
+        backups = catalog.list(target_path)
 
         if not backups:
             messagebox.showinfo("提示", "未找到任何备份文件")
@@ -1024,21 +1500,58 @@ class GameDataMigrator:
         # 创建备份选择对话框
         backup_window = tk.Toplevel(self.root)
         backup_window.title("选择备份文件")
-        backup_window.geometry("500x300")
+        backup_window.geometry("640x340")
         backup_window.resizable(True, True)
         backup_window.transient(self.root)
         backup_window.grab_set()
 
+        # 按备份方式筛选
+        filter_frame = ttk.Frame(backup_window)
+        filter_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(filter_frame, text="备份方式:").pack(side=tk.LEFT)
+        format_filter = tk.StringVar(value="全部")
+        filter_combobox = ttk.Combobox(filter_frame, textvariable=format_filter, state="readonly", width=12,
+                                       values=["全部"] + list(FORMAT_NAMES.values()))
+        filter_combobox.pack(side=tk.LEFT, padx=5)
+
         # 创建列表框
         listbox = tk.Listbox(backup_window, selectmode=tk.SINGLE, font=("SimHei", 10), fg="#e6e6e6", bg="#2c3e50")
         listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         # 添加备份到列表
-        backup_paths = []
-        for timestamp, name, path in backups:
-            display_name = f"{name} ({timestamp.strftime('%Y-%m-%d %H:%M:%S')})"
-            listbox.insert(tk.END, display_name)
-            backup_paths.append(path)
+        shown = []
+
+        def fill_list(*_):
+            listbox.delete(0, tk.END)
+            shown.clear()
+            for record in backups:
+                if format_filter.get() not in ("全部", record.format_name):
+                    continue
+                size_mb = round(record.total_bytes / (1024 * 1024), 2)
+                display_name = (f"{record.role_name} [{record.format_name}] "
+                                f"({record.created.strftime('%Y-%m-%d %H:%M:%S')})  "
+                                f"{size_mb} MB, {record.file_count} 个文件")
+                listbox.insert(tk.END, display_name)
+                shown.append(record)
+            if shown:
+                listbox.selection_set(0)
+
+        filter_combobox.bind("<<ComboboxSelected>>", fill_list)
+        fill_list()
+
+        def get_selected_record():
+            """返回选中的备份；备份已被删除时从备份目录中移除"""
+            selection = listbox.curselection()
+            if not selection:
+                return None
+            record = shown[selection[0]]
+            if not os.path.exists(record.location):
+                messagebox.showerror("错误", f"备份已不存在，将从列表中移除:\n{record.location}")
+                catalog.remove(record.location)
+                backups.remove(record)
+                fill_list()
+                return None
+            return record
 
         # 滚动条
         scrollbar = ttk.Scrollbar(listbox, orient=tk.VERTICAL, command=listbox.yview)
@@ -1050,12 +1563,14 @@ class GameDataMigrator:
         btn_frame.pack(fill=tk.X, pady=10)
 
         def do_restore():
-            selection = listbox.curselection()
-            if not selection:
+            if not listbox.curselection():
                 messagebox.showwarning("警告", "请选择一个备份文件")
                 return
+            record = get_selected_record()
+            if record is None:
+                return
 
-            selected_path = backup_paths[selection[0]]
+            selected_path = record.location
 
             # 确认恢复
             confirm = messagebox.askyesno(
@@ -1072,48 +1587,96 @@ class GameDataMigrator:
                 import threading
                 restore_thread = threading.Thread(
                     target=self.do_restore_backup,
-                    args=(selected_path, target_path)
+                    args=(selected_path, target_path, self.verify_content.get())
                 )
                 restore_thread.daemon = True
                 restore_thread.start()
 
+        def do_restore_file():
+            selection = listbox.curselection()
+            if not selection or shown[selection[0]].format not in (FORMAT_ARCHIVE, FORMAT_PACK):
+                messagebox.showwarning("警告", "请选择一个压缩归档或打包备份")
+                return
+            record = get_selected_record()
+            if record is not None:
+                self.restore_single_file(record.location, target_path, backup_window)
+
         ttk.Button(btn_frame, text="恢复", command=do_restore).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="恢复单个文件", command=do_restore_file).pack(side=tk.RIGHT, padx=5)
         ttk.Button(btn_frame, text="取消", command=backup_window.destroy).pack(side=tk.RIGHT, padx=5)
 
-        # 默认选择最新备份
-        if backups:
-            listbox.selection_set(0)
+    def restore_single_file(self, archive_path, target_path, parent):
+        """从压缩归档或打包备份中选择一个文件恢复到目标角色"""
+        from pack_backup import PACK_SUFFIX
+        if archive_path.endswith(PACK_SUFFIX):
+            from pack_backup import extract_pack_file as extract_file, list_pack_files as list_files
+        else:
+            from archive_backup import extract_file, list_archive_files as list_files
+        try:
+            names = list_files(archive_path)
+        except Exception as e:
+            self.show_error(f"读取归档失败: {str(e)}")
+            return
+
+        file_window = tk.Toplevel(parent)
+        file_window.title("选择要恢复的文件")
+        file_window.geometry("500x400")
+        file_window.transient(parent)
+        file_window.grab_set()
+
+        listbox = tk.Listbox(file_window, selectmode=tk.SINGLE, font=("SimHei", 10), fg="#e6e6e6", bg="#2c3e50")
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        for name in names:
+            listbox.insert(tk.END, name)
 
-    def do_restore_backup(self, source, dest):
-        """实际执行恢复操作"""
+        def do_extract():
+            selection = listbox.curselection()
+            if not selection:
+                messagebox.showwarning("警告", "请选择一个文件")
+                return
+            name = names[selection[0]]
+            if not messagebox.askyesno("确认恢复", f"确定要用备份中的文件覆盖目标角色中的文件吗?\n\n{name}"):
+                return
+            try:
+                extract_file(archive_path, name, target_path)
+            except Exception as e:
+                self.show_error(f"恢复文件失败: {str(e)}")
+                return
+            file_window.destroy()
+            self.log_message(f"已从 {archive_path} 恢复文件: {name}")
+            messagebox.showinfo("成功", f"文件恢复成功:\n{name}")
+
+        btn_frame = ttk.Frame(file_window)
+        btn_frame.pack(fill=tk.X, pady=10)
+        ttk.Button(btn_frame, text="恢复", command=do_extract).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="取消", command=file_window.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def do_restore_backup(self, source, dest, verify_content=False):
+        """实际执行恢复操作：比较备份与角色目录，只写入有差异的文件并删除备份中没有的文件"""
         try:
-            # 清空目标目录
-            if os.path.exists(dest):
-                for item in os.listdir(dest):
-                    item_path = os.path.join(dest, item)
-                    if os.path.isfile(item_path):
-                        os.remove(item_path)
-                    else:
-                        shutil.rmtree(item_path)
-
-            # 恢复备份
-            for item in os.listdir(source):
-                src_item = os.path.join(source, item)
-                dest_item = os.path.join(dest, item)
-
-                if os.path.isdir(src_item):
-                    shutil.copytree(src_item, dest_item)
-                else:
-                    shutil.copy2(src_item, dest_item)
-
-            self.root.after(0, lambda: self.log_message(f"备份恢复成功: {source}"))
-            self.root.after(0, lambda: messagebox.showinfo("成功", "备份恢复成功"))
-            self.root.after(0, lambda: self.status_var.set("备份恢复成功"))
-            self.root.after(0, lambda: self.restore_btn.config(state=tk.NORMAL))
+            from restore_diff import apply_restore, open_backup_source, plan_restore
+            backup = open_backup_source(source)
+            plan = plan_restore(backup, dest, verify_content)
+
+            total_files = len(plan.copy_files)
+            removed = len(plan.remove_files) + len(plan.remove_dirs)
+            self.ui_events.post(lambda: self.log_message(
+                f"比较完成: 需恢复 {total_files} 个文件, 删除 {removed} 项, {plan.unchanged} 个文件无变化"))
+
+            errors = apply_restore(plan, backup, dest, self.on_copy_progress)
+            if errors:
+                self.report_copy_errors("恢复", errors)
+                self.ui_events.post(lambda: self.restore_btn.config(state=tk.NORMAL))
+                return
+
+            self.ui_events.post(lambda: self.log_message(f"备份恢复成功: {source}"))
+            self.ui_events.post(lambda: messagebox.showinfo("成功", "备份恢复成功"))
+            self.ui_events.post(lambda: self.status_var.set("备份恢复成功"))
+            self.ui_events.post(lambda: self.restore_btn.config(state=tk.NORMAL))
 
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"恢复失败: {str(e)}"))
-            self.root.after(0, lambda: self.restore_btn.config(state=tk.NORMAL))
+            self.ui_events.post(lambda: self.show_error(f"恢复失败: {str(e)}"))
+            self.ui_events.post(lambda: self.restore_btn.config(state=tk.NORMAL))
 
     def start_migration(self):
         """开始数据迁移 - 不创建迁移前备份"""
@@ -1131,28 +1694,16 @@ class GameDataMigrator:
             messagebox.showwarning("警告", "源角色和目标角色不能相同")
             return
 
-        # 查找源角色信息
-        source_role = None
-        if source_account in self.account_roles:
-            for role in self.account_roles[source_account]:
-                if f"{role['server']} - {role['name']}" == source_role_text:
-                    source_role = role
-                    break
-
-        # 查找目标角色信息
-        target_role = None
-        if target_account in self.account_roles:
-            for role in self.account_roles[target_account]:
-                if f"{role['server']} - {role['name']}" == target_role_text:
-                    target_role = role
-                    break
+        # 查找源角色和目标角色信息
+        source_role = self.role_catalog.find(source_account, source_role_text)
+        target_role = self.role_catalog.find(target_account, target_role_text)
 
         if not source_role or not target_role:
             messagebox.showerror("错误", "无法找到选定的角色信息")
             return
 
-        source_path = source_role['path']
-        target_path = target_role['path']
+        source_path = source_role.path
+        target_path = target_role.path
 
         # 直接执行迁移，不创建迁移前备份
         self.log_message(f"开始数据迁移，不创建迁移前备份...")
@@ -1165,65 +1716,108 @@ class GameDataMigrator:
 
         # 在新线程中执行迁移
         import threading
+        self.migration_cancel = threading.Event()
         migrate_thread = threading.Thread(
             target=self.do_migration,
-            args=(source_path, target_path)
+            args=(source_path, target_path, self.migrate_mode.get(), self.verify_content.get(),
+                  self.staged_migration.get(), self.migration_cancel)
         )
         migrate_thread.daemon = True
         migrate_thread.start()
 
-    def do_migration(self, source_path, target_path):
-        """执行数据迁移（直接复制整个源角色目录到目标角色目录，不计算相同文件）"""
+    def do_migration(self, source_path, target_path, mode="full", verify_content=False, staged=False,
+                     cancel_event=None):
+        """执行数据迁移
+
+        mode 为 "full" 时删除目标后复制整个源角色目录；"delta" 只复制新增或变化的文件并删除源中没有的文件；
+        "merge" 与 "delta" 相同，但保留目标独有的文件。
+        staged 为 True 时先在暂存目录中生成新的角色数据，完成后再替换目标目录。
+        已完成的文件记录在迁移日志中，迁移被取消或中断后再次执行相同的迁移时从中断处继续。
+        """
+        from copy_executor import CopyCancelled
+        from migration_journal import MigrationJournal
+        from staged_sync import apply_staged
+        from sync_engine import POLICY_MERGE, POLICY_MIRROR, apply_sync, plan_copy, plan_sync
+
+        journal = MigrationJournal(source_path, target_path, mode, staged)
         try:
-            # 计算源目录中的文件总数，用于进度显示
-            total_files = 0
-            for root, _, files in os.walk(source_path):
-                total_files += len(files)
-
-            if total_files == 0:
-                self.root.after(0, lambda: messagebox.showinfo("提示", "源角色目录为空，无需迁移"))
-                self.root.after(0, lambda: self.finish_migration(True))
-                return
-
-            # 如果目标目录存在，先删除
-            if os.path.exists(target_path):
-                shutil.rmtree(target_path)
-
-            # 创建目标目录
-            os.makedirs(target_path, exist_ok=True)
+            if journal.open():
+                self.ui_events.post(lambda: self.log_message(
+                    f"继续上次未完成的迁移，已完成 {len(journal.done)} 个文件"))
 
-            # 复制文件并更新进度
-            copied_files = 0
-            for root, dirs, files in os.walk(source_path):
-                # 创建目标目录结构
-                rel_path = os.path.relpath(root, source_path)
-                target_root = os.path.join(target_path, rel_path)
-                os.makedirs(target_root, exist_ok=True)
-
-                # 复制文件
-                for file in files:
-                    src_file = os.path.join(root, file)
-                    dest_file = os.path.join(target_root, file)
-
-                    shutil.copy2(src_file, dest_file)
-
-                    copied_files += 1
+            if mode == "full":
+                plan = plan_copy(source_path)
+            else:
+                policy = POLICY_MERGE if mode == "merge" else POLICY_MIRROR
+                plan = plan_sync(source_path, target_path, policy, verify_content)
 
-                    # 更新进度
-                    progress = (copied_files / total_files) * 100
-                    self.root.after(0, lambda p=progress: self.progress_var.set(p))
+            if not plan.copy_files and not plan.unchanged:
+                journal.finish()
+                self.ui_events.post(lambda: messagebox.showinfo("提示", "源角色目录为空，无需迁移"))
+                self.ui_events.post(lambda: self.finish_migration(True))
+                return
 
-                    # 更新日志
-                    if copied_files % 10 == 0 or copied_files == total_files:
-                        self.root.after(0, lambda f=copied_files, t=total_files: 
-                                        self.log_message(f"已复制 {f}/{t} 文件"))
+            total_files = len(plan.copy_files)
+            copy_mb = round(plan.copy_bytes / (1024 * 1024), 2)
+            removed = len(plan.remove_files) + len(plan.remove_dirs)
+            self.ui_events.post(lambda: self.log_message(
+                f"比较完成: 需复制 {total_files} 个文件 ({copy_mb} MB), 删除 {removed} 项, "
+                f"{plan.unchanged} 个文件无变化"))
+            if plan.skipped:
+                from copy_executor import format_copy_errors
+                skipped_detail = format_copy_errors(plan.skipped)
+                self.ui_events.post(lambda: self.log_message(
+                    f"跳过 {len(plan.skipped)} 个符号链接或无法访问的项:\n{skipped_detail}"))
+
+            if staged:
+                errors = apply_staged(plan, source_path, target_path, self.on_copy_progress,
+                                      cancel_event=cancel_event, journal=journal)
+            else:
+                # 完全覆盖时先删除目标目录；日志记录删除已完成时目标中只有已复制的文件，不再删除
+                if mode == "full" and not journal.has_step('wiped'):
+                    if os.path.exists(target_path):
+                        shutil.rmtree(target_path)
+                    journal.record_step('wiped')
+                errors = apply_sync(plan, source_path, target_path, self.on_copy_progress,
+                                    cancel_event=cancel_event, journal=journal)
+            if errors:
+                journal.close()
+                self.report_copy_errors("迁移", errors)
+                self.ui_events.post(lambda: self.finish_migration(False))
+                return
 
-            self.root.after(0, lambda: self.log_message(f"数据迁移完成! 共复制 {copied_files} 个文件"))
-            self.root.after(0, lambda: self.finish_migration(True))
+            journal.finish()
+            self.ui_events.post(lambda: self.log_message(
+                f"数据迁移完成! 共复制 {total_files} 个文件, 跳过 {plan.unchanged} 个未变化的文件"))
+            self.ui_events.post(lambda: self.finish_migration(True))
 
+        except CopyCancelled:
+            journal.close()
+            self.ui_events.post(self.on_migration_cancelled)
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"迁移失败: {str(e)}"))
-            self.root.after(0, lambda: self.finish_migration(False))
+            journal.close()
+            self.ui_events.post(lambda: self.show_error(f"迁移失败: {str(e)}"))
+            self.ui_events.post(lambda: self.finish_migration(False))
+
+    def on_copy_progress(self, progress):
+        """复制进度回调，在工作线程中调用；进度条按已复制字节计算，状态栏显示速度和剩余时间"""
+        import time
+        percent = progress.percent
+        text = progress.format()
+        self.ui_events.post_latest('progress', lambda: self.progress_var.set(percent))
+        self.ui_events.post_latest('status', lambda: self.status_var.set(text))
+
+        # 更新日志
+        now = time.monotonic()
+        if now - self.last_progress_log >= 1.0 or progress.done_files == progress.total_files:
+            self.last_progress_log = now
+            self.ui_events.post(lambda: self.log_message(text))
+
+    def report_copy_errors(self, action, errors):
+        """记录复制失败的文件并提示，在工作线程中调用"""
+        from copy_executor import format_copy_errors
+        detail = format_copy_errors(errors)
+        self.ui_events.post(lambda: self.show_error(f"{action}未完成: {len(errors)} 个文件复制失败\n{detail}"))
 
     def clean_empty_directories(self, root_dir):
         """递归清理空目录"""
@@ -1231,12 +1825,13 @@ class GameDataMigrator:
             if not dirnames and not filenames:
                 try:
                     os.rmdir(dirpath)
-                    self.root.after(0, lambda p=dirpath: self.log_message(f"已删除空目录: {p}"))
+                    self.ui_events.post(lambda p=dirpath: self.log_message(f"已删除空目录: {p}"))
                 except OSError:
                     pass
 
     def finish_migration(self, success):
         """完成迁移"""
+        self.migration_cancel = None
         if success:
             self.status_var.set("迁移完成成功")
             self.progress_var.set(100)
@@ -1249,23 +1844,42 @@ class GameDataMigrator:
         self.cancel_btn.config(state=tk.DISABLED)
 
     def cancel_migration(self):
-        """取消迁移"""
+        """取消迁移：通知复制线程不再开始新的文件，正在复制的文件完成后停止"""
+        if self.migration_cancel is None:
+            return
         if messagebox.askyesno("确认取消", "确定要取消当前迁移操作吗?"):
-            self.status_var.set("迁移已取消")
-            self.progress_var.set(0)
-            self.log_message("迁移操作已取消")
-            self.migrate_btn.config(state=tk.NORMAL)
+            self.migration_cancel.set()
+            self.status_var.set("正在取消迁移...")
             self.cancel_btn.config(state=tk.DISABLED)
 
+    def on_migration_cancelled(self):
+        """迁移线程已停止"""
+        self.migration_cancel = None
+        self.status_var.set("迁移已取消")
+        self.progress_var.set(0)
+        self.log_message("迁移操作已取消，再次迁移相同的角色时将从中断处继续")
+        self.migrate_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+
     def log_message(self, message):
         """记录日志消息"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
+        self.log_view.append(f"[{timestamp}] {message}")
 
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+    def open_log_dir(self):
+        """在文件管理器中打开日志目录"""
+        import platform
+        import subprocess
+        log_dir = get_log_dir()
+        try:
+            if platform.system() == 'Windows':
+                os.startfile(log_dir)
+            elif platform.system() == 'Darwin':
+                subprocess.Popen(['open', log_dir])
+            else:
+                subprocess.Popen(['xdg-open', log_dir])
+        except OSError as e:
+            self.show_error(f"无法打开日志目录: {str(e)}")
 
     def show_error(self, message):
         """显示错误消息"""
@@ -1282,6 +1896,10 @@ class GameDataMigrator:
 
 
 if __name__ == "__main__":
+    # 打包为 exe 后，文件哈希使用的进程池需要此调用
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     root = tk.Tk()
 
     # 设置窗口背景
@@ -1292,4 +1910,5 @@ if __name__ == "__main__":
     root.option_add("*Font", font_config)
 
     app = GameDataMigrator(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.log_view.close()
\ No newline at end of file
@@ -0,0 +1,155 @@
+import json
+import mmap
+import os
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from copy_executor import get_copy_workers
+from sync_engine import scan_tree
+
+PACK_SUFFIX = '.pack'
+PACK_MAGIC = b'JX3PACK1'
+PACK_VERSION = 1
+
+# 文件尾: 索引偏移(8 字节) + 索引长度(8 字节) + PACK_MAGIC
+_TRAILER = struct.Struct('<QQ8s')
+
+# 每批预读的文件数为线程数的倍数，限制内存中等待写入的数据
+BATCH_PER_WORKER = 8
+# 超过该大小的文件不预读，写入时直接分块复制
+PREFETCH_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _read_file(path, size):
+    if size > PREFETCH_MAX_BYTES:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def create_pack(source, pack_path, max_workers=None):
+    """把角色目录打包为一个数据文件，返回 (文件数, 字节数)
+
+    文件内容依次写在 PACK_MAGIC 之后，末尾是记录各文件偏移和大小的 JSON 索引和文件尾；
+    源文件由线程池预读，打包文件只需一次顺序写入。
+    """
+    dirs, files = scan_tree(source)
+    max_workers = max_workers or get_copy_workers()
+    rel_paths = sorted(files)
+    entries = []
+
+    tmp_path = pack_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            f.write(PACK_MAGIC)
+            batch_size = max_workers * BATCH_PER_WORKER
+            for start in range(0, len(rel_paths), batch_size):
+                batch = rel_paths[start:start + batch_size]
+                for rel_path, data in zip(batch, executor.map(
+                        lambda rel: _read_file(os.path.join(source, rel), files[rel][0]), batch)):
+                    offset = f.tell()
+                    if data is None:
+                        with open(os.path.join(source, rel_path), 'rb') as fsrc:
+                            shutil.copyfileobj(fsrc, f, 1024 * 1024)
+                    else:
+                        f.write(data)
+                    entries.append([rel_path, offset, f.tell() - offset, files[rel_path][1]])
+
+            index = json.dumps({
+                'version': PACK_VERSION,
+                'dirs': sorted(dirs),
+                'files': entries,
+            }, ensure_ascii=False).encode('utf-8')
+            index_offset = f.tell()
+            f.write(index)
+            f.write(_TRAILER.pack(index_offset, len(index), PACK_MAGIC))
+        os.replace(tmp_path, pack_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(entries), sum(entry[2] for entry in entries)
+
+
+def load_pack_index(mm):
+    """从打包文件的映射中读取索引，返回 (目录列表, {相对路径: (偏移, 大小, 修改时间纳秒)})"""
+    if len(mm) < len(PACK_MAGIC) + _TRAILER.size or mm[:len(PACK_MAGIC)] != PACK_MAGIC:
+        raise ValueError("不是有效的打包备份文件")
+    index_offset, index_size, magic = _TRAILER.unpack(mm[-_TRAILER.size:])
+    if magic != PACK_MAGIC:
+        raise ValueError("打包备份文件不完整")
+    index = json.loads(mm[index_offset:index_offset + index_size].decode('utf-8'))
+    if index.get('version') != PACK_VERSION:
+        raise ValueError("不支持的打包备份版本")
+    return index['dirs'], {rel: (offset, size, mtime_ns) for rel, offset, size, mtime_ns in index['files']}
+
+
+class _PackReader:
+    """以内存映射方式打开打包文件"""
+
+    def __init__(self, pack_path):
+        self._file = open(pack_path, 'rb')
+        try:
+            self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.dirs, self.files = load_pack_index(self.mm)
+        except BaseException:
+            self.close()
+            raise
+
+    def write_file(self, rel_path, dest):
+        offset, size, mtime_ns = self.files[rel_path]
+        dest_file = os.path.join(dest, rel_path)
+        with open(dest_file, 'wb') as f:
+            f.write(self.mm[offset:offset + size])
+        os.utime(dest_file, ns=(mtime_ns, mtime_ns))
+
+    def close(self):
+        if getattr(self, 'mm', None) is not None:
+            self.mm.close()
+            self.mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def list_pack_files(pack_path):
+    with _PackReader(pack_path) as reader:
+        return sorted(reader.files)
+
+
+def extract_pack_file(pack_path, rel_path, dest):
+    """只取出一个文件写入 dest 下的对应位置"""
+    with _PackReader(pack_path) as reader:
+        os.makedirs(os.path.dirname(os.path.join(dest, rel_path)), exist_ok=True)
+        reader.write_file(rel_path, dest)
+
+
+def read_pack_listing(pack_path):
+    """读取打包文件的目录和文件，返回 (目录相对路径集合, {文件相对路径: (大小, 修改时间纳秒)})"""
+    with _PackReader(pack_path) as reader:
+        return set(reader.dirs), {rel: (size, mtime_ns) for rel, (_, size, mtime_ns) in reader.files.items()}
+
+
+def restore_pack(pack_path, dest, max_workers=None, rel_paths=None):
+    """把打包文件中的文件写入 dest，返回文件数
+
+    rel_paths 为 None 时写入全部文件(dest 应为空目录或不存在)，否则只写入其中列出的文件。
+    数据按在打包文件中的顺序读取，文件的创建和写入由线程池并行执行。
+    """
+    with _PackReader(pack_path) as reader:
+        os.makedirs(dest, exist_ok=True)
+        for rel_dir in sorted(reader.dirs, key=lambda p: (p.count(os.sep), p)):
+            os.makedirs(os.path.join(dest, rel_dir), exist_ok=True)
+        if rel_paths is None:
+            rel_paths = reader.files
+        rel_paths = sorted(rel_paths, key=lambda rel: reader.files[rel][0])
+        with ThreadPoolExecutor(max_workers=max_workers or get_copy_workers()) as executor:
+            list(executor.map(lambda rel: reader.write_file(rel, dest), rel_paths))
+        return len(rel_paths)
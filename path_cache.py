@@ -0,0 +1,87 @@
+import json
+import os
+import stat
+
+from app_config import get_app_data_dir
+from find_paths import get_folder_size
+
+CACHE_FILE_NAME = 'path_cache.json'
+CACHE_VERSION = 1
+
+
+def get_cache_path():
+    return os.path.join(get_app_data_dir(), CACHE_FILE_NAME)
+
+
+def load_path_cache():
+    """读取缓存的安装路径列表，每项为 {'path', 'mtime', 'size_mb'}"""
+    try:
+        with open(get_cache_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+        return []
+    entries = []
+    for entry in data.get('paths', []):
+        if isinstance(entry, dict) and entry.get('path'):
+            entries.append({
+                'path': entry['path'],
+                'mtime': entry.get('mtime', 0),
+                'size_mb': entry.get('size_mb', 0),
+            })
+    return entries
+
+
+def save_path_cache(entries):
+    """写入缓存，先写临时文件再替换，避免中途退出留下损坏的缓存"""
+    cache_path = get_cache_path()
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'paths': entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"保存路径缓存失败: {str(e)}")
+
+
+def make_cache_entries(game_paths):
+    """把搜索结果 [(路径, 大小, 错误信息)] 转为缓存项"""
+    entries = []
+    for path, size_mb, _ in game_paths:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue
+        entries.append({'path': path, 'mtime': mtime, 'size_mb': size_mb})
+    return entries
+
+
+def cache_to_game_paths(entries):
+    return [(entry['path'], entry['size_mb'], "") for entry in entries]
+
+
+def revalidate_path_cache(entries):
+    """检查缓存项是否仍然有效
+
+    目录不存在的项被移除；目录修改时间变化的项重新计算大小。
+    返回 (有效的缓存项, 是否有缓存项已失效)
+    """
+    valid = []
+    missing = False
+    for entry in entries:
+        try:
+            st = os.stat(entry['path'])
+        except OSError:
+            missing = True
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            missing = True
+            continue
+
+        if st.st_mtime != entry['mtime']:
+            size_mb, _ = get_folder_size(entry['path'])
+            entry = {'path': entry['path'], 'mtime': st.st_mtime, 'size_mb': size_mb}
+        valid.append(entry)
+    return valid, missing
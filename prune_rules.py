@@ -0,0 +1,137 @@
+import fnmatch
+import os
+import platform
+import re
+import stat
+import threading
+from collections import Counter
+
+from app_config import load_config
+
+# 内置排除规则：不可能包含 SeasunGame\Game 结构、却占据大部分遍历时间的目录
+# 不含路径分隔符的规则匹配目录名，含分隔符的规则匹配完整路径
+BUILTIN_EXCLUDE_PATTERNS = [
+    '$*',  # $Recycle.Bin、$WINDOWS.~BT、$SysReset 等
+    'System Volume Information',
+    'Windows',
+    'WindowsApps',
+    'WinSxS',
+    'Recovery',
+    'Package Cache',
+    'node_modules',
+    '__pycache__',
+    'site-packages',
+    '.git',
+    '.svn',
+    '.cache',
+    '/proc',
+    '/sys',
+    '/dev',
+    # /run 下只排除系统目录，/run/media 是 Linux 桌面挂载移动硬盘和其他分区的位置
+    '/run/user',
+    '/run/lock',
+    '/run/systemd',
+    '/run/udev',
+    '/run/dbus',
+    '/snap',
+    '/tmp',
+    '/var/lib',
+    '/usr',
+]
+
+_HIDDEN_ATTRIBUTES = stat.FILE_ATTRIBUTE_HIDDEN | stat.FILE_ATTRIBUTE_SYSTEM
+_IS_WINDOWS = platform.system() == 'Windows'
+
+
+class PruneRules:
+    """游戏路径搜索的剪枝规则，并按规则统计剪掉的目录数"""
+
+    def __init__(self, exclude_patterns=None, max_depth=None, skip_hidden=True, skip_mount_points=None,
+                 use_builtin=True):
+        patterns = list(BUILTIN_EXCLUDE_PATTERNS) if use_builtin else []
+        patterns.extend(exclude_patterns or [])
+
+        self.name_patterns = []
+        self.path_patterns = []
+        for pattern in patterns:
+            normalized = pattern.replace('/', os.sep).replace('\\', os.sep)
+            regex = re.compile(fnmatch.translate(os.path.normcase(normalized)))
+            if os.sep in normalized:
+                self.path_patterns.append((pattern, regex))
+            else:
+                self.name_patterns.append((pattern, regex))
+
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+        # Windows 下挂载点/目录联接可从 scandir 的属性直接判断，默认跳过；
+        # 其他系统需要额外 stat，且 /home 常为独立分区，默认不跳过
+        self.skip_mount_points = _IS_WINDOWS if skip_mount_points is None else skip_mount_points
+
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=None):
+        """从配置文件的 search 节读取规则"""
+        if config is None:
+            config = load_config()
+        search = config.get('search', {}) if isinstance(config, dict) else {}
+        return cls(
+            exclude_patterns=search.get('exclude', []),
+            max_depth=search.get('max_depth'),
+            skip_hidden=search.get('skip_hidden', True),
+            skip_mount_points=search.get('skip_mount_points'),
+            use_builtin=search.get('use_builtin_excludes', True),
+        )
+
+    def needs_parent_device(self):
+        return self.skip_mount_points and not _IS_WINDOWS
+
+    def match(self, entry, depth, parent_dev=None):
+        """返回剪掉该目录的规则名，不剪枝时返回 None"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return 'max_depth'
+
+        name = os.path.normcase(entry.name)
+        for pattern, regex in self.name_patterns:
+            if regex.match(name):
+                return f'exclude:{pattern}'
+        if self.path_patterns:
+            path = os.path.normcase(entry.path)
+            for pattern, regex in self.path_patterns:
+                if regex.match(path):
+                    return f'exclude:{pattern}'
+
+        if self.skip_hidden:
+            if _IS_WINDOWS:
+                try:
+                    # Windows 下 scandir 已带回文件属性，不产生额外 stat
+                    if entry.stat(follow_symlinks=False).st_file_attributes & _HIDDEN_ATTRIBUTES:
+                        return 'hidden'
+                except OSError:
+                    pass
+            elif entry.name.startswith('.'):
+                return 'hidden'
+
+        if self.skip_mount_points:
+            try:
+                st = entry.stat(follow_symlinks=False)
+                if _IS_WINDOWS:
+                    if st.st_file_attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT:
+                        return 'mount_point'
+                elif parent_dev is not None and st.st_dev != parent_dev:
+                    return 'mount_point'
+            except OSError:
+                pass
+
+        return None
+
+    def record(self, counter):
+        """合并某个工作线程的剪枝计数"""
+        with self._lock:
+            self.stats.update(counter)
+
+    def format_stats(self):
+        if not self.stats:
+            return "未剪枝任何目录"
+        return ", ".join(f"{rule}: {count}" for rule, count in self.stats.most_common())
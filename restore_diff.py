@@ -0,0 +1,110 @@
+import os
+import shutil
+
+from archive_backup import ARCHIVE_SUFFIX
+from copy_executor import CopyExecutor
+from pack_backup import PACK_SUFFIX
+from sync_engine import POLICY_MIRROR, plan_from_listing, scan_tree
+
+
+class _DirectorySource:
+    """目录备份(完整复制、增量快照)"""
+
+    def __init__(self, location):
+        self.location = location
+        self.dirs, self.files = scan_tree(location)
+
+    def manifest(self):
+        from manifest import refresh_manifest
+        return refresh_manifest(self.location)
+
+    def write(self, rel_paths, dest, on_progress=None):
+        return CopyExecutor().run(self.location, dest, [], [(rel, self.files[rel][0]) for rel in rel_paths],
+                                  on_progress)
+
+
+class _StoreSource:
+    """备份库中的备份，清单中已有内容哈希"""
+
+    def __init__(self, location):
+        from backup_store import BackupStore
+        self.store = BackupStore()
+        self.snapshot = self.store.load_snapshot(location)
+        self.dirs = set(self.snapshot.dirs)
+        self.files = {rel: (size, mtime_ns) for rel, (size, mtime_ns, _) in self.snapshot.files.items()}
+
+    def manifest(self):
+        return self.snapshot.files
+
+    def write(self, rel_paths, dest, on_progress=None):
+        self.store.restore_files(self.snapshot, rel_paths, dest)
+        return []
+
+
+class _ArchiveSource:
+    """压缩归档，列表来自中央目录和索引，不解压文件内容"""
+
+    def __init__(self, location):
+        from archive_backup import read_archive_listing
+        self.location = location
+        self.dirs, self.files = read_archive_listing(location)
+
+    manifest = None
+
+    def write(self, rel_paths, dest, on_progress=None):
+        from archive_backup import restore_archive
+        restore_archive(self.location, dest, rel_paths)
+        return []
+
+
+class _PackSource:
+    """打包备份，列表来自偏移索引"""
+
+    def __init__(self, location):
+        from pack_backup import read_pack_listing
+        self.location = location
+        self.dirs, self.files = read_pack_listing(location)
+
+    manifest = None
+
+    def write(self, rel_paths, dest, on_progress=None):
+        from pack_backup import restore_pack
+        restore_pack(self.location, dest, rel_paths=rel_paths)
+        return []
+
+
+def open_backup_source(location):
+    """按备份位置打开备份：目录、.zip 归档、.pack 打包文件或备份库清单(.json)"""
+    if os.path.isdir(location):
+        return _DirectorySource(location)
+    if location.endswith(ARCHIVE_SUFFIX):
+        return _ArchiveSource(location)
+    if location.endswith(PACK_SUFFIX):
+        return _PackSource(location)
+    return _StoreSource(location)
+
+
+def plan_restore(backup, target_path, verify_content=False):
+    """比较备份与角色目录，生成恢复计划：只写入有差异的文件，删除备份中没有的文件
+
+    verify_content 为 True 时大小相同的文件按内容哈希比较(目录备份和备份库备份)，
+    归档和打包备份没有内容哈希，按大小和修改时间比较。
+    """
+    src_manifest = None
+    if verify_content and backup.manifest is not None:
+        src_manifest = backup.manifest()
+    return plan_from_listing(backup.dirs, backup.files, target_path, POLICY_MIRROR, src_manifest)
+
+
+def apply_restore(plan, backup, target_path, on_progress=None):
+    """执行恢复计划，返回写入失败的文件 [(相对路径, 错误信息)]"""
+    for rel_path in plan.remove_files:
+        os.remove(os.path.join(target_path, rel_path))
+    for rel_path in plan.remove_dirs:
+        shutil.rmtree(os.path.join(target_path, rel_path))
+    os.makedirs(target_path, exist_ok=True)
+    for rel_dir in plan.make_dirs:
+        os.makedirs(os.path.join(target_path, rel_dir), exist_ok=True)
+    if not plan.copy_files:
+        return []
+    return backup.write([rel for rel, _ in plan.copy_files], target_path, on_progress)
@@ -0,0 +1,108 @@
+import sys
+
+
+class Role:
+    """角色记录，使用 __slots__ 并驻留重复出现的账号/大区/服务器字符串以节省内存"""
+
+    __slots__ = ('path', 'account', 'region', 'server_name', 'name', 'index')
+
+    def __init__(self, path, account, region, server_name, name):
+        self.path = path
+        self.account = sys.intern(account)
+        self.region = sys.intern(region)
+        self.server_name = sys.intern(server_name)
+        self.name = name
+        self.index = 0
+
+    @property
+    def server(self):
+        """显示用的服务器名: 大区 - 服务器"""
+        return f"{self.region} - {self.server_name}"
+
+    @property
+    def label(self):
+        """角色下拉框中显示的文本"""
+        return f"{self.region} - {self.server_name} - {self.name}"
+
+    @property
+    def key(self):
+        return self.account, self.region, self.server_name, self.name
+
+    def __repr__(self):
+        return f"Role({self.path!r})"
+
+
+class RoleCatalog:
+    """角色目录，按 (账号, 大区, 服务器, 角色名)、路径和下拉框文本建立索引"""
+
+    def __init__(self):
+        self._by_path = {}  # 路径 -> 角色，保持加入顺序
+        self._by_key = {}
+        self._by_label = {}  # (账号, 下拉框文本) -> 角色
+        self._accounts = {}  # 账号 -> {路径: 角色}
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def __iter__(self):
+        return iter(self._by_path.values())
+
+    def __contains__(self, path):
+        return path in self._by_path
+
+    def clear(self):
+        self._by_path.clear()
+        self._by_key.clear()
+        self._by_label.clear()
+        self._accounts.clear()
+
+    def add_account(self, account):
+        """登记账号(账号下可能没有角色)"""
+        self._accounts.setdefault(sys.intern(account), {})
+
+    def add(self, role):
+        """加入角色，已存在相同路径时返回 False"""
+        if role.path in self._by_path:
+            return False
+        role.index = len(self._by_path) + 1
+        self._by_path[role.path] = role
+        self._by_key[role.key] = role
+        self._by_label[(role.account, role.label)] = role
+        self._accounts.setdefault(role.account, {})[role.path] = role
+        return True
+
+    def remove(self, path):
+        """移除角色，返回被移除的角色；编号需调用 renumber 更新"""
+        role = self._by_path.pop(path, None)
+        if role is None:
+            return None
+        self._by_key.pop(role.key, None)
+        self._by_label.pop((role.account, role.label), None)
+        self._accounts.get(role.account, {}).pop(path, None)
+        return role
+
+    def renumber(self):
+        for i, role in enumerate(self._by_path.values(), 1):
+            role.index = i
+
+    def get(self, account, region, server_name, name):
+        return self._by_key.get((account, region, server_name, name))
+
+    def get_by_path(self, path):
+        return self._by_path.get(path)
+
+    def find(self, account, label):
+        """按账号和下拉框文本查找角色"""
+        return self._by_label.get((account, label))
+
+    def has_account(self, account):
+        return account in self._accounts
+
+    def accounts(self):
+        return sorted(self._accounts)
+
+    def roles(self, account):
+        return list(self._accounts.get(account, {}).values())
+
+    def labels(self, account):
+        return [role.label for role in self._accounts.get(account, {}).values()]
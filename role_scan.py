@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app_config import get_app_data_dir
+from role_catalog import Role
+from staged_sync import is_staging_dir
+
+ROLE_CACHE_FILE_NAME = 'role_cache.json'
+ROLE_CACHE_VERSION = 1
+
+# 账号目录下的大区目录名
+REGION_NAMES = ('电信区', '双线区', '无界区')
+
+
+def _list_subdirs(path):
+    """列出子目录名(已排序)，目录类型直接取自 scandir 结果"""
+    names = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                # 与 os.walk 一致，不进入指向目录的符号链接
+                if entry.is_dir(follow_symlinks=False):
+                    names.append(entry.name)
+            except OSError:
+                continue
+    names.sort()
+    return names
+
+
+def is_role_name(name):
+    # 排除名称包含'手动备份'的目录，以及迁移时的暂存目录
+    return '手动备份' not in name and not is_staging_dir(name)
+
+
+def is_account_candidate(name):
+    return len(name) >= 4 and '.dat' not in name
+
+
+def list_accounts(userdata_path):
+    """列出包含大区目录的账号"""
+    accounts = []
+    for user in _list_subdirs(userdata_path):
+        if not is_account_candidate(user):
+            continue
+        try:
+            subdirs = _list_subdirs(os.path.join(userdata_path, user))
+        except OSError:
+            continue
+        if any(entry in REGION_NAMES for entry in subdirs):
+            accounts.append(user)
+    return accounts
+
+
+def scan_account_roles(userdata_path, account):
+    """枚举一个账号下的角色
+
+    角色目录位于 userdata 下第 4 级(账号/大区/服务器/角色)，只遍历到这一级，不进入角色目录内部。
+    """
+    roles = []
+    account_path = os.path.join(userdata_path, account)
+    try:
+        regions = _list_subdirs(account_path)
+    except OSError:
+        return roles
+    for region in regions:
+        region_path = os.path.join(account_path, region)
+        try:
+            servers = _list_subdirs(region_path)
+        except OSError:
+            continue
+        for server in servers:
+            server_path = os.path.join(region_path, server)
+            try:
+                role_names = _list_subdirs(server_path)
+            except OSError:
+                continue
+            for role_name in role_names:
+                if is_role_name(role_name):
+                    role_path = os.path.join(server_path, role_name)
+                    roles.append(Role(role_path, account, region, server, role_name))
+    return roles
+
+
+class RoleScanCache:
+    """持久化的角色目录缓存
+
+    记录 userdata、账号、大区、服务器各级目录的修改时间及其子目录列表。
+    刷新时逐级 stat，只有修改时间变化的目录才重新列出，未变化的部分直接取自缓存。
+    """
+
+    def __init__(self, userdata_path):
+        self.userdata_path = userdata_path
+        self.rescanned = 0  # 本次重新列出的目录数
+        self._lock = threading.Lock()
+        self._tree = self._load()
+
+    def _load(self):
+        try:
+            with open(get_role_cache_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != ROLE_CACHE_VERSION:
+            return {}
+        tree = data.get('paths', {}).get(self.userdata_path)
+        return tree if isinstance(tree, dict) else {}
+
+    def save(self):
+        """写回缓存文件，保留其他游戏路径的缓存"""
+        cache_path = get_role_cache_path()
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get('version') != ROLE_CACHE_VERSION:
+                data = {}
+        except (OSError, ValueError):
+            data = {}
+        data['version'] = ROLE_CACHE_VERSION
+        with self._lock:
+            data.setdefault('paths', {})[self.userdata_path] = self._tree
+
+        tmp_path = cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"保存角色缓存失败: {str(e)}")
+
+    def _refresh_node(self, node, path):
+        """目录修改时间变化时重新列出子目录，返回更新后的节点"""
+        mtime = os.stat(path).st_mtime_ns
+        if node and node.get('mtime') == mtime:
+            return node
+
+        names = _list_subdirs(path)
+        with self._lock:
+            self.rescanned += 1
+        old_children = node.get('children', {}) if node else {}
+        # 子目录节点先保留，由下一级按各自的修改时间判断是否需要重新列出
+        children = {name: old_children.get(name, {}) for name in names}
+        return {'mtime': mtime, 'children': children}
+
+    def list_accounts(self):
+        """列出包含大区目录的账号"""
+        self._tree = self._refresh_node(self._tree, self.userdata_path)
+        accounts = []
+        for user, node in self._tree['children'].items():
+            if not is_account_candidate(user):
+                continue
+            try:
+                node = self._refresh_node(node, os.path.join(self.userdata_path, user))
+            except OSError:
+                continue
+            with self._lock:
+                self._tree['children'][user] = node
+            if any(entry in REGION_NAMES for entry in node['children']):
+                accounts.append(user)
+        return accounts
+
+    def scan_account_roles(self, account):
+        """枚举一个账号下的角色，只重新列出修改时间变化的大区/服务器目录"""
+        roles = []
+        account_path = os.path.join(self.userdata_path, account)
+        with self._lock:
+            account_node = self._tree.get('children', {}).get(account, {})
+        try:
+            account_node = self._refresh_node(account_node, account_path)
+        except OSError:
+            return roles
+
+        for region, region_node in list(account_node['children'].items()):
+            region_path = os.path.join(account_path, region)
+            try:
+                region_node = self._refresh_node(region_node, region_path)
+            except OSError:
+                continue
+            account_node['children'][region] = region_node
+
+            for server, server_node in list(region_node['children'].items()):
+                server_path = os.path.join(region_path, server)
+                try:
+                    server_node = self._refresh_node(server_node, server_path)
+                except OSError:
+                    continue
+                region_node['children'][server] = server_node
+
+                for role_name in server_node['children']:
+                    if is_role_name(role_name):
+                        role_path = os.path.join(server_path, role_name)
+                        roles.append(Role(role_path, account, region, server, role_name))
+
+        with self._lock:
+            self._tree.setdefault('children', {})[account] = account_node
+        return roles
+
+    def account_candidate_mtimes(self):
+        """返回缓存中 userdata 下所有可能是账号的目录及其修改时间，包括还没有大区目录的新账号"""
+        with self._lock:
+            return {os.path.join(self.userdata_path, user): node.get('mtime')
+                    for user, node in self._tree.get('children', {}).items() if is_account_candidate(user)}
+
+    def directory_mtimes(self, accounts):
+        """返回已缓存的 userdata、账号、大区、服务器各级目录及其修改时间(供目录监视使用)"""
+        with self._lock:
+            mtimes = {self.userdata_path: self._tree.get('mtime')}
+            account_nodes = self._tree.get('children', {})
+            for account in accounts:
+                account_path = os.path.join(self.userdata_path, account)
+                account_node = account_nodes.get(account, {})
+                mtimes[account_path] = account_node.get('mtime')
+                for region, region_node in account_node.get('children', {}).items():
+                    region_path = os.path.join(account_path, region)
+                    mtimes[region_path] = region_node.get('mtime')
+                    for server, server_node in region_node.get('children', {}).items():
+                        mtimes[os.path.join(region_path, server)] = server_node.get('mtime')
+        return mtimes
+
+
+def get_role_cache_path():
+    return os.path.join(get_app_data_dir(), ROLE_CACHE_FILE_NAME)
+
+
+def iter_account_roles(userdata_path, accounts=None, max_workers=None, cache=None):
+    """并行扫描各账号，每扫描完一个账号就返回 (账号, 角色列表)
+
+    传入 RoleScanCache 时，只重新列出修改时间变化的目录。
+    """
+    if accounts is None:
+        accounts = cache.list_accounts() if cache is not None else list_accounts(userdata_path)
+    if not accounts:
+        return
+
+    if cache is not None:
+        def scan(account):
+            return cache.scan_account_roles(account)
+    else:
+        def scan(account):
+            return scan_account_roles(userdata_path, account)
+
+    workers = max_workers or min(16, len(accounts), (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scan, account): account for account in accounts}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,154 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import select
+import threading
+
+from role_scan import RoleScanCache
+
+# inotify 事件掩码：只关心子目录的增删与改名
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+
+class _Inotify:
+    """通过 ctypes 调用 Linux inotify"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches = {}  # 路径 -> watch descriptor
+
+    def update_watches(self, paths):
+        """让监视的目录与 paths 保持一致"""
+        paths = set(paths)
+        for path in list(self._watches):
+            if path not in paths:
+                self._libc.inotify_rm_watch(self.fd, self._watches.pop(path))
+        # 已监视的目录也重新添加：目录被删除后重建时旧的 watch 已失效，重复添加只会返回原 wd
+        for path in paths:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                self._watches[path] = wd
+
+    def wait(self, timeout):
+        """等待事件，有事件返回 True；事件内容不需要解析，只读出丢弃"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _create_inotify():
+    if platform.system() != 'Linux':
+        return None
+    try:
+        return _Inotify()
+    except (OSError, AttributeError):
+        return None
+
+
+class RoleWatcher:
+    """监视 userdata 目录，角色增删时通过 callback(events) 通知
+
+    events 为 [(事件类型, Role)]，事件类型为 'add'、'remove' 或 'change'；
+    'change' 表示角色仍在，但所在服务器目录发生了变化(如角色目录被替换)。
+    Linux 下使用 inotify，其他系统定时检查账号/大区/服务器各级目录的修改时间。
+    检测到变化后用 RoleScanCache 增量刷新，只重新列出修改时间变化的目录。
+    """
+
+    def __init__(self, userdata_path, callback, interval=2.0, debounce=0.5):
+        self.userdata_path = userdata_path
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._cache = RoleScanCache(userdata_path)
+        self._roles = {}
+        self._dir_mtimes = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _scan(self):
+        """增量刷新角色，返回 (角色字典, 各级目录的修改时间)"""
+        accounts = self._cache.list_accounts()
+        roles = {}
+        for account in accounts:
+            for role in self._cache.scan_account_roles(account):
+                roles[role.path] = role
+        # 新账号的大区目录可能稍后才创建，所有可能是账号的目录都需要监视
+        dir_mtimes = self._cache.account_candidate_mtimes()
+        dir_mtimes.update(self._cache.directory_mtimes(accounts))
+        return roles, dir_mtimes
+
+    def _diff(self, roles, dir_mtimes):
+        events = []
+        for path, role in roles.items():
+            server_path = os.path.dirname(path)
+            if path not in self._roles:
+                events.append(('add', role))
+            elif dir_mtimes.get(server_path) != self._dir_mtimes.get(server_path):
+                events.append(('change', role))
+        for path, role in self._roles.items():
+            if path not in roles:
+                events.append(('remove', role))
+        return events
+
+    def _run(self):
+        inotify = _create_inotify()
+        try:
+            self._roles, self._dir_mtimes = self._scan()
+            if inotify is not None:
+                inotify.update_watches(self._dir_mtimes)
+
+            while not self._stop_event.is_set():
+                if inotify is not None:
+                    if not inotify.wait(self.interval):
+                        continue
+                    # 合并短时间内的连续事件(如复制整个角色目录)
+                    while inotify.wait(self.debounce) and not self._stop_event.is_set():
+                        pass
+                elif self._stop_event.wait(self.interval):
+                    break
+
+                try:
+                    roles, dir_mtimes = self._scan()
+                except OSError as e:
+                    print(f"检查角色目录失败: {str(e)}")
+                    continue
+                events = self._diff(roles, dir_mtimes)
+                self._roles, self._dir_mtimes = roles, dir_mtimes
+                if inotify is not None:
+                    inotify.update_watches(dir_mtimes)
+                if events:
+                    self.callback(events)
+        finally:
+            if inotify is not None:
+                inotify.close()
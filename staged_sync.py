@@ -0,0 +1,199 @@
+import errno
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from copy_executor import CopyCancelled, CopyExecutor, get_copy_workers
+from sync_engine import scan_tree
+
+# 暂存目录与被替换的旧目录，与目标目录位于同一父目录下，保证改名不跨分区
+STAGING_SUFFIX = '.__staging__'
+OLD_SUFFIX = '.__old__'
+
+# 不支持硬链接的文件系统(如 FAT32/exFAT，Windows 下为 EINVAL)返回的错误
+_LINK_UNSUPPORTED_ERRNOS = {errno.EPERM, errno.EXDEV, errno.EMLINK, errno.EINVAL,
+                            getattr(errno, 'ENOTSUP', errno.EPERM), getattr(errno, 'EOPNOTSUPP', errno.EPERM)}
+
+
+def is_staging_dir(name):
+    return name.endswith(STAGING_SUFFIX) or name.endswith(OLD_SUFFIX)
+
+
+def get_staging_paths(target_path):
+    """返回 (暂存目录, 旧目录)"""
+    target_path = os.path.normpath(target_path)
+    return target_path + STAGING_SUFFIX, target_path + OLD_SUFFIX
+
+
+def recover_staged(target_path, keep_staging=False):
+    """清理上次中断的暂存迁移
+
+    两次改名之间中断时目标目录不存在，此时把旧目录改回原名；其余情况删除残留的旧目录。
+    keep_staging 为 False 时同时删除残留的暂存目录，为 True 时保留以继续上次的迁移。
+    """
+    staging_path, old_path = get_staging_paths(target_path)
+    if os.path.isdir(old_path):
+        if not os.path.exists(target_path):
+            os.rename(old_path, target_path)
+        else:
+            shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(staging_path) and not keep_staging:
+        shutil.rmtree(staging_path)
+
+
+def link_files(target_path, staging_path, rel_paths, cancel_event=None, journal=None):
+    """把保留的文件硬链接到暂存目录，返回无法链接、需要复制的文件"""
+    for i, rel_path in enumerate(rel_paths):
+        if cancel_event is not None and cancel_event.is_set():
+            raise CopyCancelled()
+        staged_file = os.path.join(staging_path, rel_path)
+        target_file = os.path.join(target_path, rel_path)
+        if journal is not None and journal.is_done(rel_path, staged_file, target_file):
+            continue
+        if os.path.lexists(staged_file):
+            os.remove(staged_file)
+        try:
+            os.link(target_file, staged_file)
+        except OSError as e:
+            if e.errno in _LINK_UNSUPPORTED_ERRNOS:
+                # 文件系统不支持硬链接，剩余文件全部复制
+                return rel_paths[i:]
+            raise
+        if journal is not None:
+            journal.record(rel_path, staged_file, target_file)
+    return []
+
+
+def _prune_stale(staging_path, plan, make_dirs):
+    """继续上次的迁移时，删除暂存目录中本次计划以外的文件和目录(如源中已删除的文件)"""
+    expected_files = set(plan.keep_files) | {rel for rel, _ in plan.copy_files}
+    expected_dirs = set(make_dirs)
+    dirs, files = scan_tree(staging_path)
+    for rel_path in files:
+        if rel_path not in expected_files:
+            os.remove(os.path.join(staging_path, rel_path))
+    for rel_path in sorted(dirs, key=lambda p: p.count(os.sep), reverse=True):
+        if rel_path not in expected_dirs:
+            shutil.rmtree(os.path.join(staging_path, rel_path), ignore_errors=True)
+
+
+def _unlink_pending(staging_path, source_root, rel_paths, journal):
+    """继续上次的迁移时，删除暂存目录中需要重新复制的文件
+
+    这些文件可能是上次从目标硬链接过来的，原地写入会同时修改目标中的文件；日志中已完成的文件保留。
+    """
+    for rel_path in rel_paths:
+        staged_file = os.path.join(staging_path, rel_path)
+        if journal.is_done(rel_path, staged_file, os.path.join(source_root, rel_path)):
+            continue
+        try:
+            os.remove(staged_file)
+        except FileNotFoundError:
+            pass
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path):
+    """把目录项(改名)写入磁盘；Windows 不支持打开目录，直接跳过"""
+    if os.name == 'nt':
+        return
+    try:
+        _fsync_file(path)
+    except OSError:
+        pass
+
+
+def flush_files(root, rel_paths, max_workers=None):
+    """集中把复制的文件写入磁盘，确保替换目录前数据已落盘"""
+    if not rel_paths:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers or get_copy_workers()) as executor:
+        list(executor.map(_fsync_file, [os.path.join(root, rel) for rel in rel_paths]))
+
+
+def swap_in(staging_path, target_path):
+    """用两次改名把暂存目录换为目标目录，返回被换下的旧目录(目标原先不存在时为 None)"""
+    _, old_path = get_staging_paths(target_path)
+    if not os.path.exists(target_path):
+        os.rename(staging_path, target_path)
+        _fsync_dir(os.path.dirname(target_path))
+        return None
+
+    os.rename(target_path, old_path)
+    try:
+        os.rename(staging_path, target_path)
+    except OSError:
+        os.rename(old_path, target_path)
+        raise
+    _fsync_dir(os.path.dirname(target_path))
+    return old_path
+
+
+def drop_dir_async(path):
+    """在后台线程中删除被换下的旧目录"""
+    thread = threading.Thread(target=shutil.rmtree, args=(path,), kwargs={'ignore_errors': True})
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def apply_staged(plan, source_path, target_path, on_progress=None, max_workers=None, cancel_event=None,
+                 journal=None):
+    """在暂存目录中生成新的目标内容后替换目标目录，返回复制失败的文件 [(相对路径, 错误信息)]
+
+    plan 中保留的文件从目标目录硬链接到暂存目录，变化的文件从源目录复制；
+    复制期间目标目录保持原样，有文件复制失败时丢弃暂存目录，目标不受影响。
+    传入 journal 时失败、取消或中断后保留暂存目录，下次执行相同的迁移时跳过日志中已完成的文件。
+    """
+    resume = journal is not None and journal.resumed
+    recover_staged(target_path, keep_staging=resume)
+    staging_path, _ = get_staging_paths(target_path)
+    executor = CopyExecutor(max_workers)
+    make_dirs = sorted(set(plan.keep_dirs) | set(plan.make_dirs), key=lambda p: (p.count(os.sep), p))
+
+    try:
+        os.makedirs(staging_path, exist_ok=resume)
+        if resume:
+            _prune_stale(staging_path, plan, make_dirs)
+        for rel_dir in make_dirs:
+            os.makedirs(os.path.join(staging_path, rel_dir), exist_ok=True)
+
+        fallback = link_files(target_path, staging_path, plan.keep_files, cancel_event, journal)
+        if resume:
+            _unlink_pending(staging_path, target_path, fallback, journal)
+            _unlink_pending(staging_path, source_path, [rel for rel, _ in plan.copy_files], journal)
+        copied = list(fallback)
+        errors = []
+        if fallback:
+            sizes = [(rel, os.path.getsize(os.path.join(target_path, rel))) for rel in fallback]
+            errors.extend(executor.run(target_path, staging_path, [], sizes, on_progress, cancel_event, journal))
+        errors.extend(executor.run(source_path, staging_path, [], plan.copy_files, on_progress, cancel_event,
+                                   journal))
+        if errors:
+            if journal is None:
+                shutil.rmtree(staging_path, ignore_errors=True)
+            return errors
+
+        copied.extend(rel for rel, _ in plan.copy_files)
+        flush_files(staging_path, copied, executor.max_workers)
+        old_path = swap_in(staging_path, target_path)
+    except BaseException:
+        if journal is None:
+            shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+
+    if old_path is not None:
+        drop_dir_async(old_path)
+
+    if plan.source_manifest is not None:
+        from manifest import refresh_manifest
+        refresh_manifest(target_path, reuse=[plan.source_manifest])
+    return []
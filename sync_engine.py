@@ -0,0 +1,205 @@
+import os
+import shutil
+
+from copy_executor import CopyExecutor
+
+# 同步策略
+POLICY_MIRROR = 'mirror'  # 目标与源完全一致，删除目标独有的文件
+POLICY_MERGE = 'merge'  # 保留目标独有的文件
+
+# 修改时间比较的容差(纳秒)，copy2 会保留修改时间
+MTIME_TOLERANCE_NS = 1000000
+
+
+def scan_tree(root, skipped=None):
+    """扫描目录树，返回 (子目录相对路径集合, {文件相对路径: (大小, 修改时间纳秒)})
+
+    符号链接(无论指向文件还是目录)不列出；无法访问的子目录和文件跳过，不中断扫描。
+    skipped 为列表时把跳过的项记录为 (相对路径, 原因)。文件大小与修改时间来自 scandir 结果。
+    """
+    dirs = set()
+    files = {}
+    if not os.path.isdir(root):
+        return dirs, files
+
+    def skip(rel_path, reason):
+        if skipped is not None:
+            skipped.append((rel_path, reason))
+
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except OSError as e:
+            if not rel_dir:
+                raise
+            skip(rel_dir, str(e))
+            continue
+        with it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    if entry.is_symlink():
+                        skip(rel_path, "符号链接")
+                    elif entry.is_dir(follow_symlinks=False):
+                        dirs.add(rel_path)
+                        stack.append(rel_path)
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        files[rel_path] = (st.st_size, st.st_mtime_ns)
+                except OSError as e:
+                    skip(rel_path, str(e))
+    return dirs, files
+
+
+class SyncPlan:
+    """一次同步需要执行的操作"""
+
+    def __init__(self):
+        self.remove_files = []  # 需删除的目标文件(含与源目录同名的文件)
+        self.remove_dirs = []  # 需删除的目标目录(含与源文件同名的目录)
+        self.make_dirs = []  # 需创建的目录，浅的在前
+        self.copy_files = []  # 需复制的文件 (相对路径, 大小)
+        self.unchanged = 0  # 无需复制的文件数
+        self.keep_files = []  # 保留在目标中的文件(未变化的文件，合并时还有目标独有的文件)
+        self.keep_dirs = []  # 保留在目标中的目录
+        self.source_manifest = None  # 校验内容时源目录的清单
+        self.skipped = []  # 扫描源目录时跳过的项 (相对路径, 原因)，目标中的同名项不删除
+
+    @property
+    def copy_bytes(self):
+        return sum(size for _, size in self.copy_files)
+
+    def is_empty(self):
+        return not (self.remove_files or self.remove_dirs or self.make_dirs or self.copy_files)
+
+
+def _is_removed(rel_path, removed_dirs):
+    """rel_path 是否位于将被删除的目录中"""
+    return any(rel_path.startswith(parent + os.sep) for parent in removed_dirs)
+
+
+def _same_file(rel_path, src_info, dst_info, src_manifest=None, dst_manifest=None):
+    if src_info[0] != dst_info[0]:
+        return False
+    if src_manifest is not None:
+        # 大小相同时比较内容哈希，不依赖修改时间
+        src_entry = src_manifest.get(rel_path)
+        dst_entry = dst_manifest.get(rel_path)
+        return src_entry is not None and dst_entry is not None and src_entry[2] == dst_entry[2]
+    return abs(src_info[1] - dst_info[1]) <= MTIME_TOLERANCE_NS
+
+
+def plan_sync(source_path, target_path, policy=POLICY_MIRROR, verify_content=False):
+    """比较源目录与目标目录，生成同步计划
+
+    按大小和修改时间判断文件是否相同(verify_content 为 True 时改为比较内容哈希，
+    哈希来自两边目录的清单，未变化的文件沿用已保存的哈希)，
+    只复制新增或变化的文件；POLICY_MIRROR 下删除源中没有的文件和目录。
+    """
+    skipped = []
+    src_dirs, src_files = scan_tree(source_path, skipped)
+    src_manifest = None
+    if verify_content:
+        from manifest import refresh_manifest
+        src_manifest = refresh_manifest(source_path)
+    return plan_from_listing(src_dirs, src_files, target_path, policy, src_manifest, skipped)
+
+
+def plan_from_listing(src_dirs, src_files, target_path, policy=POLICY_MIRROR, src_manifest=None,
+                      src_skipped=None):
+    """按源的目录和文件列表(如备份归档的索引)与目标目录比较，生成同步计划
+
+    src_files 为 {相对路径: (大小, 修改时间纳秒)}；给出 src_manifest 时按内容哈希比较大小相同的文件；
+    src_skipped 为扫描源时跳过的项 [(相对路径, 原因)]，目标中对应的文件和目录不会被删除。
+    """
+    dst_dirs, dst_files = scan_tree(target_path)
+    plan = SyncPlan()
+    plan.skipped = list(src_skipped or [])
+    protected = {rel for rel, _ in plan.skipped}
+
+    def is_protected(rel_path):
+        return rel_path in protected or _is_removed(rel_path, protected)
+
+    dst_manifest = None
+    if src_manifest is not None:
+        from manifest import refresh_manifest
+        dst_manifest = refresh_manifest(target_path) if os.path.isdir(target_path) else {}
+        plan.source_manifest = src_manifest
+
+    # 类型冲突：同名的一边是文件、一边是目录，无论哪种策略都要先删除目标
+    for rel_path in src_dirs & set(dst_files):
+        plan.remove_files.append(rel_path)
+    for rel_path in set(src_files) & dst_dirs:
+        plan.remove_dirs.append(rel_path)
+
+    if policy == POLICY_MIRROR:
+        plan.remove_files.extend(rel for rel in dst_files if rel not in src_files and rel not in src_dirs
+                                 and not is_protected(rel))
+        plan.remove_dirs.extend(rel for rel in dst_dirs if rel not in src_dirs and rel not in src_files
+                                and not is_protected(rel))
+
+    # 只删除最上层的目录，其中的文件和子目录随之删除
+    removed = set()
+    for rel_path in sorted(plan.remove_dirs, key=lambda p: p.count(os.sep)):
+        if not _is_removed(rel_path, removed):
+            removed.add(rel_path)
+    plan.remove_dirs = sorted(removed)
+    plan.remove_files = [rel for rel in plan.remove_files if not _is_removed(rel, removed)]
+
+    # 目标中已删除或不存在的目录需要创建
+    plan.make_dirs = sorted((rel for rel in src_dirs if rel not in dst_dirs or rel in removed),
+                            key=lambda p: (p.count(os.sep), p))
+
+    plan.keep_dirs = sorted((rel for rel in dst_dirs
+                             if not _is_removed(rel, removed) and rel not in removed
+                             and (rel in src_dirs or policy == POLICY_MERGE or is_protected(rel))),
+                            key=lambda p: (p.count(os.sep), p))
+
+    for rel_path, src_info in sorted(src_files.items()):
+        dst_info = dst_files.get(rel_path)
+        if dst_info is not None and not _is_removed(rel_path, removed) and _same_file(
+                rel_path, src_info, dst_info, src_manifest, dst_manifest):
+            plan.unchanged += 1
+            plan.keep_files.append(rel_path)
+            continue
+        plan.copy_files.append((rel_path, src_info[0]))
+
+    # 合并时保留目标独有的文件；镜像时只保留源中被跳过的项对应的文件，暂存替换时它们也会链接到新目录
+    plan.keep_files.extend(rel for rel in sorted(dst_files)
+                           if rel not in src_files and rel not in src_dirs and not _is_removed(rel, removed)
+                           and (policy == POLICY_MERGE or is_protected(rel)))
+    return plan
+
+
+def plan_copy(source_path):
+    """完整复制源目录的计划(目标中的内容全部不保留)"""
+    plan = SyncPlan()
+    src_dirs, src_files = scan_tree(source_path, plan.skipped)
+    plan.make_dirs = sorted(src_dirs, key=lambda p: (p.count(os.sep), p))
+    plan.copy_files = sorted((rel, info[0]) for rel, info in src_files.items())
+    return plan
+
+
+def apply_sync(plan, source_path, target_path, on_progress=None, max_workers=None, cancel_event=None,
+               journal=None):
+    """执行同步计划，返回复制失败的文件 [(相对路径, 错误信息)]
+
+    on_progress(TransferProgress) 在复制过程中定时调用，进度按字节计算；
+    cancel_event 与 journal 见 CopyExecutor.run。
+    """
+    for rel_path in plan.remove_files:
+        os.remove(os.path.join(target_path, rel_path))
+    for rel_path in plan.remove_dirs:
+        shutil.rmtree(os.path.join(target_path, rel_path))
+
+    executor = CopyExecutor(max_workers)
+    errors = executor.run(source_path, target_path, plan.make_dirs, plan.copy_files, on_progress,
+                          cancel_event, journal)
+
+    if plan.source_manifest is not None:
+        # 复制的文件保留了源文件的大小和修改时间，目标清单直接沿用源清单的哈希
+        from manifest import refresh_manifest
+        refresh_manifest(target_path, reuse=[plan.source_manifest])
+    return errors
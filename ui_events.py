@@ -0,0 +1,62 @@
+import collections
+import threading
+
+# 主线程处理事件的间隔(毫秒)
+DRAIN_INTERVAL_MS = 50
+
+
+class UIEventQueue:
+    """工作线程向界面发送更新的通道
+
+    工作线程调用 post/post_latest 放入回调，Tk 主循环每隔 interval 毫秒取出并依次执行，
+    不再由每个工作线程各自调用 root.after。post_latest 按 key 合并：同一 key 在一次处理前
+    多次提交时只执行最后一次(如进度条、状态栏)，其余回调按提交顺序全部执行。
+    """
+
+    def __init__(self, root, interval=DRAIN_INTERVAL_MS):
+        self.root = root
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._events = collections.deque()  # (序号, key, 回调)
+        self._latest = {}  # key -> 最后一次提交的序号
+        self._seq = 0
+        self._after_id = None
+
+    def post(self, callback):
+        """提交回调，在主线程中按提交顺序执行"""
+        self.post_latest(None, callback)
+
+    def post_latest(self, key, callback):
+        """提交可合并的回调，同一 key 只执行最后提交的一次"""
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, key, callback))
+            if key is not None:
+                self._latest[key] = self._seq
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        with self._lock:
+            events = self._events
+            latest = self._latest
+            self._events = collections.deque()
+            self._latest = {}
+        try:
+            for seq, key, callback in events:
+                if key is not None and latest.get(key) != seq:
+                    continue
+                try:
+                    callback()
+                except Exception as e:
+                    # 单个回调出错不影响后续事件
+                    print(f"界面更新失败: {str(e)}")
+        finally:
+            self._after_id = self.root.after(self.interval, self._drain)